@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from backend.utils import profiling
+
+router = APIRouter()
+
+
+def require_admin(request: Request):
+    """Hide the admin surface from anyone without the configured ADMIN_TOKEN"""
+    if not profiling.is_admin(request):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/profiler", dependencies=[Depends(require_admin)])
+async def profiler_status():
+    """
+    Running profiler session and the file written by the last one
+    """
+    return profiling.profiler_control.status()
+
+
+@router.post("/profiler/start", dependencies=[Depends(require_admin)])
+async def start_profiler(kind: str = "sampling", duration: float = Query(30.0, gt=0, le=profiling.MAX_PROFILE_SECONDS)):
+    """
+    Profile this worker for a time window
+
+    Args:
+        kind: "sampling" (collapsed stacks for flamegraphs) or "torch" (Chrome trace of CPU ops)
+        duration: Seconds until the profiler stops and writes its output
+    """
+    try:
+        return profiling.profiler_control.start(kind, duration)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/profiler/stop", dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    """
+    Stop the running profiler early and write its output
+    """
+    return profiling.profiler_control.stop()
+
+
+@router.get("/traces", dependencies=[Depends(require_admin)])
+async def recent_traces(limit: int = Query(50, ge=1, le=500)):
+    """
+    Per-stage timings of recently traced requests
+    """
+    return {"sample_rate": profiling.tracer.sample_rate, "traces": profiling.tracer.recent(limit)}
+
+
+@router.put("/traces/sample-rate", dependencies=[Depends(require_admin)])
+async def set_trace_sample_rate(rate: float = Query(..., ge=0.0, le=1.0)):
+    """
+    Change the fraction of requests that are traced
+    """
+    profiling.tracer.sample_rate = rate
+    return {"sample_rate": rate}
+
+
+@router.post("/traces/dump", dependencies=[Depends(require_admin)])
+async def dump_traces():
+    """
+    Write the kept traces as a Chrome trace file (chrome://tracing, Perfetto) and clear them
+    """
+    return {"path": str(profiling.tracer.dump())}
@@ -1,69 +1,269 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Any, Optional, Union
 import os
 from pathlib import Path
 import torch
 from transformers import CLIPProcessor, CLIPModel
-from qdrant_client import QdrantClient
+from qdrant_client.http import models
 import numpy as np
 
 from PIL import Image
 
+from backend.models.image import SessionCreated, SessionFeedback
+from backend.services.image_fields import STYLE_FIELD, payload_style
+from backend.services.recommendation_sessions import SessionRecommendationService
+from backend.services.thumbnail_cache import SourceTooLarge, ThumbnailService
+from backend.utils import admission, profiling
+from backend.utils.projection import ProjectionResolver
+from backend.utils.sharding import ShardedQdrantClient, get_images_qdrant_client
+from backend.utils.search_profiles import SearchProfile, search_params
+from backend.utils.streaming import progressive_search_events, stream_events
+
 router = APIRouter()
 
 # Initialize CLIP model and processor
 model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
 processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient("localhost", port=6333)
+# Shared Qdrant client, or one spread over the QDRANT_SHARDS instances
+qdrant_client = get_images_qdrant_client()
+
+# Optional dimensionality reduction of whichever collection the alias points to
+projections = ProjectionResolver(qdrant_client, "midjourney-images")
+
+
+def _is_indexed_image_url(url: str) -> bool:
+    """Whether an image URL belongs to an indexed image"""
+    url_filter = models.Filter(must=[models.FieldCondition(key="image_url", match=models.MatchValue(value=url))])
+    return qdrant_client.count("midjourney-images", count_filter=url_filter, exact=False).count > 0
+
+
+# Thumbnail proxy with on-disk LRU cache; remote originals only from configured hosts
+# and the hosts of indexed image URLs
+thumbnail_service = ThumbnailService(
+    allowed_hosts=[host.strip() for host in os.getenv("THUMBNAIL_ALLOWED_HOSTS", "").split(",") if host.strip()],
+    is_indexed_url=_is_indexed_image_url,
+)
+THUMBNAIL_CACHE_CONTROL = "public, max-age=86400, immutable"
+
+# Like/skip browsing sessions for sequential recommendations
+session_service = SessionRecommendationService(qdrant_client, "midjourney-images")
 
 
 def get_image_embedding(image_file) -> np.ndarray:
     """Generate embedding for an uploaded image"""
     try:
-        image = Image.open(image_file)
-        inputs = processor(images=image, return_tensors="pt", padding=True)
-        image_features = model.get_image_features(**inputs)
-        return image_features.detach().numpy()[0]
+        with profiling.stage("decode"):
+            image = Image.open(image_file)
+            image.load()
+        with profiling.stage("preprocess"):
+            inputs = processor(images=image, return_tensors="pt", padding=True)
+        with profiling.stage("embed"):
+            image_features = model.get_image_features(**inputs)
+            embedding = image_features.detach().numpy()[0]
+            projection = projections.get()
+            return projection.transform(embedding) if projection else embedding
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
 
+def _style_filter(style: Optional[str]) -> Optional[models.Filter]:
+    """Server-side filter on the style precomputed at index time"""
+    if not style:
+        return None
+    return models.Filter(must=[models.FieldCondition(key=STYLE_FIELD, match=models.MatchValue(value=style))])
+
+
+def _search(
+    query_vector: np.ndarray,
+    limit: int,
+    params: Optional[models.SearchParams] = None,
+    style: Optional[str] = None,
+) -> List[Any]:
+    """Search the Midjourney collection, optionally with explicit precision settings"""
+    with profiling.stage("qdrant"):
+        return qdrant_client.search(
+            collection_name="midjourney-images",
+            query_vector=query_vector,
+            query_filter=_style_filter(style),
+            limit=limit,
+            search_params=params,
+        )
+
+
+def _format_result(result) -> Dict[str, Any]:
+    """Format a scored point for the frontend grid"""
+    if result.payload.get("image_url"):
+        thumbnail_service.allow_url(result.payload["image_url"])
+    return {
+        "id": result.id,
+        "image_url": result.payload.get("image_url"),
+        "name": result.payload.get("name", "Unknown"),
+        "style": payload_style(result.payload) or "",
+        "similarity_score": round((1 - float(result.score)) * 100, 2),  # Convert to percentage
+    }
+
+
 @router.post("/search")
-async def search_similar_images(image: UploadFile = File(...), limit: int = 9) -> List[Dict[str, Any]]:
+async def search_similar_images(
+    request: Request,
+    image: UploadFile = File(...),
+    limit: int = 9,
+    style: Optional[str] = None,
+    profile: Optional[SearchProfile] = None,
+) -> List[Dict[str, Any]]:
     """
     Find similar images in Midjourney dataset based on uploaded image
 
     Args:
         image: Image file to find similar images for
         limit: Maximum number of results to return (default: 9 for 3x3 grid)
+        style: Only return images of this style (e.g. "Art Nouveau")
+        profile: Search precision; "auto" trades recall for latency as the request deadline nears
+    """
+    async with admission.admit(request, "images.search", admission.LANE_BULK):
+        try:
+            # Generate embedding for uploaded image
+            query_vector = await run_in_threadpool(get_image_embedding, image.file)
+
+            # Search for similar images
+            params = search_params(profile, request.state.deadline)
+            results = await run_in_threadpool(_search, query_vector, limit, params, style)
+
+            # Format results
+            with profiling.stage("serialize"):
+                return [_format_result(result) for result in results]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error finding similar images: {str(e)}")
+
+
+@router.post("/search/stream")
+async def stream_similar_images(
+    request: Request, image: UploadFile = File(...), limit: int = 9, style: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Stream similar images as NDJSON (or SSE with Accept: text/event-stream).
+
+    Emits "fast" hits from a low-ef pass, then "refined" hits for any rank that
+    changed, and finally a "done" event with the count.
+
+    Args:
+        image: Image file to find similar images for
+        limit: Maximum number of results to return (default: 9 for 3x3 grid)
+        style: Only return images of this style
+    """
+    ticket = await admission.acquire(request, "images.search", admission.LANE_BULK)
+    try:
+        # Embed before streaming starts so bad uploads still get a 400
+        query_vector = await run_in_threadpool(get_image_embedding, image.file)
+    except BaseException:
+        ticket.release()
+        raise
+
+    events = progressive_search_events(
+        search=lambda hnsw_ef: _search(query_vector, limit, models.SearchParams(hnsw_ef=hnsw_ef), style),
+        render=_format_result,
+    )
+    return stream_events(request, events, on_close=ticket.release)
+
+
+def _parse_point_id(value: str) -> Union[int, str]:
+    """Qdrant point ids are unsigned integers or UUID strings"""
+    return int(value) if value.isdigit() else value
+
+
+@router.post("/sessions", response_model=SessionCreated)
+async def create_session(
+    request: Request, image: Optional[UploadFile] = File(None), seed_image_id: Optional[str] = Form(None)
+) -> SessionCreated:
+    """
+    Start a sequential recommendation session
+
+    Args:
+        image: Optional image whose embedding seeds the session
+        seed_image_id: Optional id of an indexed image to start from
+    """
+    seed_vector = None
+    if image is not None:
+        async with admission.admit(request, "images.search", admission.LANE_BULK):
+            seed_vector = await run_in_threadpool(get_image_embedding, image.file)
+
+    seed_ids = [_parse_point_id(seed_image_id)] if seed_image_id else []
+    return SessionCreated(session_id=session_service.create_session(seed_vector, seed_ids))
+
+
+@router.post("/sessions/{session_id}/feedback")
+async def record_session_feedback(session_id: str, feedback: SessionFeedback):
+    """
+    Record that the user liked or skipped an image in a session
+    """
+    try:
+        session_service.record_feedback(session_id, feedback.image_id, liked=feedback.action == "like")
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return {"status": "recorded"}
+
+
+@router.get("/sessions/{session_id}/next")
+def next_session_page(session_id: str, limit: int = Query(9, ge=1, le=100)) -> List[Dict[str, Any]]:
+    """
+    Get the next page of recommendations, using the session's likes and skips
+    and excluding every image already shown
+
+    Args:
+        session_id: Session to continue
+        limit: Maximum number of results to return (default: 9 for 3x3 grid)
     """
     try:
-        # Generate embedding for uploaded image
-        query_vector = get_image_embedding(image.file)
-
-        # Search for similar images
-        results = qdrant_client.search(collection_name="midjourney-images", query_vector=query_vector, limit=limit)
-
-        # Format results
-        similar_images = []
-        for result in results:
-            similar_images.append(
-                {
-                    "image_url": result.payload.get("image_url"),
-                    "name": result.payload.get("name", "Unknown"),
-                    "style": result.payload.get("url", "").replace("/styles/", "").replace("-", " ").title(),
-                    "similarity_score": round((1 - float(result.score)) * 100, 2),  # Convert to percentage
-                }
-            )
-
-        return similar_images
+        results = session_service.next_page(session_id, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error finding similar images: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching recommendations: {str(e)}")
+
+    return [_format_result(result) for result in results]
+
+
+@router.get("/thumb")
+async def get_thumbnail(request: Request, src: str, size: int = Query(300, ge=16, le=1024)) -> Response:
+    """
+    Serve a cached WebP thumbnail of a result image
+
+    Args:
+        src: URL of an indexed image (on an allowed host) or local path under data/images
+        size: Maximum width and height of the thumbnail in pixels
+    """
+    etag = f'"{thumbnail_service.etag(src, size)}"'
+    headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    data = await run_in_threadpool(thumbnail_service.get_cached, src, size)
+    if data is None:
+        # Downloads and renders count against admission; cache hits do not
+        async with admission.admit(request, "images.thumb", admission.LANE_BULK):
+            try:
+                data, _ = await run_in_threadpool(thumbnail_service.get_thumbnail, src, size)
+            except SourceTooLarge as e:
+                raise HTTPException(status_code=413, detail=f"Thumbnail source too large: {str(e)}")
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid thumbnail source: {str(e)}")
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=f"Error generating thumbnail: {str(e)}")
+
+    return Response(content=data, media_type="image/webp", headers=headers)
 
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "image-recommendation"}
+    """Health check endpoint, with per-shard health when the collection is sharded"""
+    health = {"status": "healthy", "service": "image-recommendation"}
+    if isinstance(qdrant_client, ShardedQdrantClient):
+        health["shards"] = qdrant_client.snapshot()
+    return health
@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from backend.api.admin_routes import router as admin_router
 from backend.api.user_routes import router as user_router
 from backend.api.image_routes import router as image_router
+from backend.api.product_routes import router as product_router
+from backend.utils import admission, profiling, singleflight
 
 app = FastAPI(title="AI Matching System", description="User matching and image recommendation system", version="1.0.0")
 
@@ -15,10 +19,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include routers
+# Stage tracing of sampled requests; see /api/admin
+app.add_middleware(profiling.TraceRequestsMiddleware)
+
 # Include routers
 app.include_router(user_router, prefix="/api/users", tags=["users"])
 app.include_router(image_router, prefix="/api/images", tags=["images"])
+app.include_router(product_router, prefix="/api/products", tags=["products"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"], include_in_schema=False)
 
 
 @app.get("/")
@@ -27,3 +35,27 @@ async def root():
     Root endpoint returning API information
     """
     return {"name": "AI Matching System API", "version": "1.0.0", "status": "running"}
+
+
+@app.exception_handler(admission.Overloaded)
+async def overloaded_handler(request: Request, exc: admission.Overloaded):
+    """
+    Shed load with a fast 503 when admission queues are full or a deadline expires
+    """
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.get("/api/admission")
+async def admission_status():
+    """
+    Occupancy and shed/expired counters of the admission queues
+    """
+    return admission.snapshot()
+
+
+@app.get("/api/coalescing")
+async def coalescing_status():
+    """
+    How many identical concurrent requests shared a single computation
+    """
+    return singleflight.snapshot()
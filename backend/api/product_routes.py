@@ -0,0 +1,65 @@
+import io
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from backend.api import image_routes
+from backend.services.unified_search import UnifiedSearcher
+from backend.utils import admission, profiling
+from backend.utils.search_profiles import SearchProfile
+
+router = APIRouter()
+# Shares the CLIP model already loaded by the image routes
+product_searcher = UnifiedSearcher(clip_model=image_routes.model, clip_processor=image_routes.processor)
+
+
+def _load_image(data: bytes) -> Image.Image:
+    """Decode an uploaded product image"""
+    try:
+        with profiling.stage("decode"):
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            return image
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+
+
+@router.post("/search")
+async def search_products(
+    request: Request,
+    query: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    top_k: int = Form(5, ge=1, le=100),
+    profile: Optional[SearchProfile] = Form(None),
+) -> Dict[str, Any]:
+    """
+    Find products by text description or by a product image
+
+    Args:
+        query: Text description of the product (used when no image is uploaded)
+        image: Product image to find similar products for
+        top_k: Number of results to return
+        profile: Search precision; "auto" trades recall for latency as the request deadline nears
+    """
+    if image is None and not (query and query.strip()):
+        raise HTTPException(status_code=400, detail="Provide a text query or an image")
+
+    lane = admission.LANE_BULK if image is not None else admission.LANE_INTERACTIVE
+    async with admission.admit(request, "products.search", lane):
+        search_query = query
+        if image is not None:
+            search_query = await run_in_threadpool(_load_image, await image.read())
+        results = await run_in_threadpool(product_searcher.search, search_query, top_k, profile, request.state.deadline)
+        if results["status"] == "error":
+            raise HTTPException(status_code=500, detail=f"Error searching products: {results['message']}")
+        return results
+
+
+@router.get("/health")
+async def health_check():
+    """
+    Health check endpoint to verify API is running
+    """
+    return {"status": "healthy", "service": "product-search"}
@@ -1,29 +1,84 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List
 
-from backend.models.user import UserQuery, UserMatchResponse
+from backend.models.user import UserQuery, UserMatchResponse, MutualMatchResponse
 from backend.services.user_matching import UserMatchingService
+from backend.utils import admission
+from backend.utils.streaming import stream_events
 
 router = APIRouter()
 user_service = UserMatchingService()
 
 
 @router.post("/match", response_model=UserMatchResponse)
-async def find_matching_users(query: UserQuery) -> UserMatchResponse:
+async def find_matching_users(query: UserQuery, request: Request) -> UserMatchResponse:
     """
     Find matching users based on natural language query.
 
     Args:
-        query (UserQuery): Query parameters including search text and limit
+        query (UserQuery): Query parameters including search text, limit, optional facet weights
+            and search profile ("auto" trades recall for latency as the request deadline nears)
 
     Returns:
         UserMatchResponse: List of matching users with compatibility scores
     """
+    async with admission.admit(request, "users.match", admission.LANE_INTERACTIVE):
+        try:
+            matches = await run_in_threadpool(
+                user_service.find_matches,
+                query.query,
+                query.limit,
+                query.weights,
+                query.profile,
+                request.state.deadline,
+            )
+            return matches
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid query: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error finding matches: {str(e)}")
+
+
+@router.post("/match/stream")
+async def stream_matching_users(query: UserQuery, request: Request) -> StreamingResponse:
+    """
+    Stream matching users as NDJSON (or SSE with Accept: text/event-stream).
+
+    Emits a "query" event, then "fast" hits from a low-ef pass, then "refined"
+    hits for any rank that changed, and finally a "done" event with the count.
+
+    Args:
+        query (UserQuery): Query parameters including search text, limit and optional facet weights
+    """
+    # Validate before admission and streaming, so bad weights get a 400 like /match
+    try:
+        weights = user_service._facet_weights(query.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {str(e)}")
+
+    ticket = await admission.acquire(request, "users.match", admission.LANE_INTERACTIVE)
+    events = user_service.stream_matches(query.query, query.limit, weights)
+    return stream_events(request, events, on_close=ticket.release)
+
+
+@router.get("/{user_id}/mutual", response_model=MutualMatchResponse)
+async def get_mutual_matches(user_id: str, limit: int = 10) -> MutualMatchResponse:
+    """
+    Get users who appear in each other's top matches, as precomputed by the
+    mutual matching batch job.
+
+    Args:
+        user_id (str): Id of the user to look up
+        limit (int): Maximum number of mutual matches to return
+    """
     try:
-        matches = user_service.find_matches(query.query, query.limit)
-        return matches
+        return await run_in_threadpool(user_service.get_mutual_matches, user_id, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"User not found: {user_id}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error finding matches: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching mutual matches: {str(e)}")
 
 
 @router.get("/health")
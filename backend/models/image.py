@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from pydantic import BaseModel
 
 
@@ -24,3 +24,12 @@ class ImageRecommendation(BaseModel):
 class ImageRecommendationResponse(BaseModel):
     recommendations: List[ImageRecommendation]
     next_token: Optional[str] = None  # For pagination/next functionality
+
+
+class SessionCreated(BaseModel):
+    session_id: str
+
+
+class SessionFeedback(BaseModel):
+    image_id: Union[int, str]
+    action: Literal["like", "skip"]
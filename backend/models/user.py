@@ -1,6 +1,8 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
+from backend.utils.search_profiles import SearchProfile
+
 
 class BasicInfo(BaseModel):
     name: str
@@ -33,6 +35,10 @@ class User(BaseModel):
 class UserQuery(BaseModel):
     query: str
     limit: Optional[int] = 5
+    # Relative weight per profile facet (interests, values, expertise)
+    weights: Optional[Dict[str, float]] = None
+    # Latency/recall trade-off of the search
+    profile: Optional[SearchProfile] = None
 
 
 class UserMatch(BaseModel):
@@ -44,3 +50,14 @@ class UserMatch(BaseModel):
 class UserMatchResponse(BaseModel):
     matches: List[UserMatch]
     query_understanding: str
+
+
+class MutualMatch(BaseModel):
+    user: User
+    mutual_score: float
+    similarity: float
+
+
+class MutualMatchResponse(BaseModel):
+    user_id: str
+    matches: List[MutualMatch]
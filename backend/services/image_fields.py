@@ -0,0 +1,123 @@
+import argparse
+import logging
+from typing import Any, Dict, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils.sharding import get_images_qdrant_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Display and explanation fields derived once at index time, so queries only read them
+STYLE_FIELD = "style"
+FORMAT_FIELD = "format"
+WIDTH_FIELD = "width_px"
+HEIGHT_FIELD = "height_px"
+WIDTH_BUCKET_FIELD = "width_bucket"
+HEIGHT_BUCKET_FIELD = "height_bucket"
+DIMENSION_BUCKET_PX = 100
+# Dimensions closer than this count as similar in explanations
+SIMILAR_DIMENSION_PX = 100
+
+# Payload indexes that let Qdrant filter and group on the derived fields
+DERIVED_FIELD_SCHEMAS = {
+    STYLE_FIELD: models.PayloadSchemaType.KEYWORD,
+    FORMAT_FIELD: models.PayloadSchemaType.KEYWORD,
+    WIDTH_BUCKET_FIELD: models.PayloadSchemaType.INTEGER,
+    HEIGHT_BUCKET_FIELD: models.PayloadSchemaType.INTEGER,
+}
+
+
+def style_name(url: str) -> str:
+    """Readable style name from a Midjourney style path such as "/styles/art-nouveau" """
+    return url.replace("/styles/", "").replace("-", " ").title()
+
+
+def payload_style(payload: Dict[str, Any]) -> Optional[str]:
+    """Precomputed style of a point, or the one parsed from its URL if it predates the field"""
+    if STYLE_FIELD in payload:
+        return payload[STYLE_FIELD]
+    if payload.get("url"):
+        return style_name(payload["url"])
+    return None
+
+
+def derived_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute the derived fields of an image payload"""
+    fields = {}
+    if payload.get("url"):
+        fields[STYLE_FIELD] = style_name(payload["url"])
+
+    technical = payload.get("technical_metadata") or {}
+    if technical.get("type") == "local":
+        dimensions = technical.get("dimensions") or {}
+        if "width" in dimensions:
+            fields[WIDTH_FIELD] = dimensions["width"]
+            fields[WIDTH_BUCKET_FIELD] = dimensions["width"] // DIMENSION_BUCKET_PX
+        if "height" in dimensions:
+            fields[HEIGHT_FIELD] = dimensions["height"]
+            fields[HEIGHT_BUCKET_FIELD] = dimensions["height"] // DIMENSION_BUCKET_PX
+        if technical.get("format"):
+            fields[FORMAT_FIELD] = technical["format"].upper()
+    return fields
+
+
+def with_derived_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a payload with its derived fields added"""
+    return {**payload, **derived_fields(payload)}
+
+
+def ensure_payload_indexes(qdrant: QdrantClient, collection_name: str):
+    """Create the payload indexes of the derived fields (a no-op if they exist)"""
+    for field_name, field_schema in DERIVED_FIELD_SCHEMAS.items():
+        qdrant.create_payload_index(collection_name, field_name=field_name, field_schema=field_schema)
+
+
+def backfill_derived_fields(
+    qdrant: QdrantClient, collection_name: str, page_size: int = 1024, batch_size: int = 256
+) -> int:
+    """
+    Add derived fields to points indexed before they existed, without re-embedding.
+
+    Returns:
+        Number of points updated
+    """
+    ensure_payload_indexes(qdrant, collection_name)
+
+    updated = 0
+    operations = []
+    offset = None
+    while True:
+        records, offset = qdrant.scroll(collection_name=collection_name, limit=page_size, offset=offset)
+        for record in records:
+            payload = record.payload or {}
+            fields = derived_fields(payload)
+            if any(payload.get(name) != value for name, value in fields.items()):
+                operations.append(
+                    models.SetPayloadOperation(set_payload=models.SetPayload(payload=fields, points=[record.id]))
+                )
+            if len(operations) == batch_size:
+                qdrant.batch_update_points(collection_name=collection_name, update_operations=operations)
+                updated += len(operations)
+                operations = []
+        if offset is None:
+            break
+    if operations:
+        qdrant.batch_update_points(collection_name=collection_name, update_operations=operations)
+        updated += len(operations)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill precomputed display fields of indexed images")
+    parser.add_argument("--collection", default="midjourney-images")
+    args = parser.parse_args()
+
+    updated = backfill_derived_fields(get_images_qdrant_client(), args.collection)
+    logger.info(f"Updated derived fields of {updated} points in '{args.collection}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import json
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 from PIL import Image
 import torch
@@ -9,35 +10,67 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
 from backend.models.image import ImageMetadata, ImageRecommendation, ImageRecommendationResponse
+from backend.services.image_fields import (
+    FORMAT_FIELD,
+    HEIGHT_FIELD,
+    SIMILAR_DIMENSION_PX,
+    WIDTH_FIELD,
+    ensure_payload_indexes,
+    payload_style,
+    with_derived_fields,
+)
+from backend.utils.collections import ensure_collection
+from backend.utils.dedup import ImageDeduplicator
+from backend.utils.projection import CLIP_EMBEDDING_SIZE, STORAGE_DATATYPES, EmbeddingProjection, ProjectionResolver
+from backend.utils.search_profiles import resolve_profile, search_params
+from backend.utils.sharding import get_images_qdrant_client, stable_point_id
+from backend.utils.singleflight import SingleFlight
 
 
 class ImageRecommendationService:
-    def __init__(self):
+    def __init__(self, initialize_collection: bool = True, qdrant: Optional[QdrantClient] = None):
         # Initialize CLIP model for image embeddings
         self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
         self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
 
-        # Initialize Qdrant client
-        self.qdrant = QdrantClient("localhost", port=6333)
+        # Shared (possibly sharded) Qdrant client unless one is injected (e.g. in-memory for tests)
+        self.qdrant = qdrant or get_images_qdrant_client()
         self.collection_name = "midjourney-images"
+        self._coalescer = SingleFlight("images.find_similar_images")
 
-        # Create collection if it doesn't exist
-        self._initialize_collection()
+        # Optional dimensionality reduction of whichever collection the alias points to
+        self.projections = ProjectionResolver(self.qdrant, self.collection_name)
+
+        # Skips exact/near duplicate images during ingestion
+        self.deduplicator = ImageDeduplicator()
+        self._fingerprints_loaded = False
+
+        # Create collection if it doesn't exist; offline tools may skip this
+        if initialize_collection:
+            self._initialize_collection()
 
     def _initialize_collection(self):
         """Initialize Qdrant collection for image features"""
-        try:
-            self.qdrant.get_collection(self.collection_name)
-        except Exception:
-            self.qdrant.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=512,  # CLIP embedding size
-                    distance=models.Distance.COSINE,
-                ),
-                # No need to create collection as it exists with Midjourney data
-                if_exists=models.CollectionExistsAction.IGNORE,
-            )
+        ensure_collection(self.qdrant, self.collection_name, self.vectors_config())
+        ensure_payload_indexes(self.qdrant, self.collection_name)
+
+    @property
+    def projection(self) -> Optional[EmbeddingProjection]:
+        """Projection of the collection the alias currently points to"""
+        return self.projections.get()
+
+    @projection.setter
+    def projection(self, projection: Optional[EmbeddingProjection]):
+        # Offline tools embed for a collection that is not behind the alias yet
+        self.projections.pin(projection)
+
+    def vectors_config(self, storage: str = "float32") -> models.VectorParams:
+        """Vector configuration of the image collection"""
+        return models.VectorParams(
+            size=self.projection.dims if self.projection else CLIP_EMBEDDING_SIZE,
+            distance=models.Distance.COSINE,
+            datatype=STORAGE_DATATYPES[storage],
+        )
 
     def _generate_image_embedding(self, image_path: str) -> np.ndarray:
         """Generate embedding for an image using CLIP"""
@@ -47,7 +80,9 @@ class ImageRecommendationService:
         with torch.no_grad():
             image_features = self.model.get_image_features(**inputs)
 
-        return image_features.numpy()[0]
+        embedding = image_features.numpy()[0]
+        projection = self.projection
+        return projection.transform(embedding) if projection else embedding
 
     def _extract_image_features(self, image_path: str) -> Dict[str, Any]:
         """Extract or fetch image features"""
@@ -68,8 +103,10 @@ class ImageRecommendationService:
                 "size": Path(image_path).stat().st_size,
             }
 
-    def index_image(self, image_path: str, labels: List[str], image_id: str):
-        """Index an image in Qdrant"""
+    def build_point(
+        self, image_path: str, labels: List[str], image_id: str, content_features: Optional[Dict[str, Any]] = None
+    ) -> models.PointStruct:
+        """Embed an image and its metadata into a Qdrant point"""
         # Generate embedding
         embedding = self._generate_image_embedding(image_path)
 
@@ -82,60 +119,142 @@ class ImageRecommendationService:
             filename=Path(image_path).name,
             labels=labels,
             technical_metadata=tech_features,
-            content_features={"embedding_size": embedding.shape[0]},
+            content_features={"embedding_size": embedding.shape[0], **(content_features or {})},
         )
 
-        # Index in Qdrant
-        self.qdrant.upsert(
+        # Style, dimension buckets and format are derived here once rather than per query
+        return models.PointStruct(
+            id=stable_point_id(image_id),
+            vector=embedding.tolist(),
+            payload=with_derived_fields(json.loads(metadata.model_dump_json())),
+        )
+
+    def _load_fingerprints(self):
+        """Seed the deduplicator with hashes of images indexed by earlier runs"""
+        if self._fingerprints_loaded:
+            return
+
+        offset = None
+        while True:
+            records, offset = self.qdrant.scroll(
+                collection_name=self.collection_name, limit=1024, offset=offset, with_payload=["id", "content_features"]
+            )
+            for record in records:
+                features = (record.payload or {}).get("content_features") or {}
+                if "sha256" in features and "phash" in features:
+                    self.deduplicator.add(features, record.payload.get("id"))
+            if offset is None:
+                break
+        self._fingerprints_loaded = True
+
+    def _has_embedding_duplicate(self, point: models.PointStruct, image_id: str) -> bool:
+        """Check whether another indexed image is already closer than the dedup threshold"""
+        # Stored copies of the same image are the one being re-indexed, not duplicates
+        own_copies = models.Filter(
+            must_not=[
+                models.HasIdCondition(has_id=[point.id]),
+                models.FieldCondition(key="id", match=models.MatchValue(value=image_id)),
+            ]
+        )
+        results = self.qdrant.search(
             collection_name=self.collection_name,
-            points=[
-                models.PointStruct(
-                    id=hash(image_id), vector=embedding.tolist(), payload=json.loads(metadata.model_dump_json())
-                )
-            ],
+            query_vector=point.vector,
+            query_filter=own_copies,
+            limit=1,
+            score_threshold=self.deduplicator.embedding_threshold,
         )
+        return bool(results)
+
+    def index_image(self, image_path: str, labels: List[str], image_id: str) -> bool:
+        """
+        Index an image in Qdrant unless it duplicates another one already indexed.
+
+        Re-indexing an existing image_id updates its labels and metadata.
+
+        Returns:
+            True if the image was indexed, False if it was skipped as a duplicate
+        """
+        self._load_fingerprints()
+
+        # Cheap hash checks first, so duplicates never reach CLIP
+        fingerprint = self.deduplicator.fingerprint(Path(image_path).read_bytes())
+        if self.deduplicator.check(fingerprint, image_id):
+            return False
+
+        started = time.perf_counter()
+        point = self.build_point(image_path, labels, image_id, content_features=fingerprint)
+        duplicate = self._has_embedding_duplicate(point, image_id)
+        self.deduplicator.record_embedding(time.perf_counter() - started, duplicate=duplicate)
+        if duplicate:
+            return False
+
+        self.qdrant.upsert(collection_name=self.collection_name, points=[point])
+        self.deduplicator.add(fingerprint, image_id)
+        return True
 
     def _calculate_similarity_aspects(
         self, reference_metadata: Dict[str, Any], candidate_metadata: Dict[str, Any]
     ) -> List[str]:
-        """Calculate aspects of similarity between two images"""
+        """Calculate aspects of similarity between two images from their precomputed fields"""
         aspects = []
 
         # For Midjourney images
         if "name" in candidate_metadata:
             aspects.append(f"Artist/Style: {candidate_metadata['name']}")
 
-        if "url" in candidate_metadata:
-            style = candidate_metadata["url"].replace("/styles/", "").replace("-", " ").title()
+        style = payload_style(candidate_metadata)
+        if style is not None:
             aspects.append(f"Art Style: {style}")
 
-        # For local images, compare technical aspects if available
-        if (
-            "technical_metadata" in reference_metadata
-            and "technical_metadata" in candidate_metadata
-            and all(
-                meta.get("type") == "local"
-                for meta in [reference_metadata["technical_metadata"], candidate_metadata["technical_metadata"]]
-            )
-        ):
-            ref_tech = reference_metadata["technical_metadata"]
-            cand_tech = candidate_metadata["technical_metadata"]
+        # For local images, compare the technical aspects extracted at index time
+        def shared(field: str) -> Optional[Any]:
+            value = candidate_metadata.get(field)
+            return value if value is not None and value == reference_metadata.get(field) else None
+
+        def close(field: str) -> bool:
+            candidate, reference = candidate_metadata.get(field), reference_metadata.get(field)
+            return candidate is not None and reference is not None and abs(candidate - reference) < SIMILAR_DIMENSION_PX
 
-            if abs(ref_tech["dimensions"]["width"] - cand_tech["dimensions"]["width"]) < 100:
-                aspects.append("Similar width")
-            if abs(ref_tech["dimensions"]["height"] - cand_tech["dimensions"]["height"]) < 100:
-                aspects.append("Similar height")
-            if ref_tech["format"] == cand_tech["format"]:
-                aspects.append(f"Same format: {ref_tech['format']}")
+        if close(WIDTH_FIELD):
+            aspects.append("Similar width")
+        if close(HEIGHT_FIELD):
+            aspects.append("Similar height")
+        if shared(FORMAT_FIELD):
+            aspects.append(f"Same format: {candidate_metadata[FORMAT_FIELD]}")
 
         return aspects or ["Visual similarity based on content analysis"]
 
     def find_similar_images(
-        self, reference_image_id: str, limit: int = 5, prev_token: str = None
+        self,
+        reference_image_id: str,
+        limit: int = 5,
+        prev_token: str = None,
+        profile: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> ImageRecommendationResponse:
+        """
+        Find similar images based on a reference image
+
+        Args:
+            profile: Search precision ("fast", "balanced", "exact" or "auto")
+            deadline: Monotonic deadline of the request, used by the "auto" profile
+        """
+        profile = resolve_profile(profile, deadline)
+
+        # Identical concurrent requests share one retrieve and search
+        return self._coalescer.do(
+            (reference_image_id, limit, prev_token, profile),
+            lambda: self._find_similar_images(reference_image_id, limit, prev_token, profile),
+        )
+
+    def _find_similar_images(
+        self, reference_image_id: str, limit: int, prev_token: Optional[str], profile: Optional[str]
     ) -> ImageRecommendationResponse:
-        """Find similar images based on a reference image"""
         # Get reference image
-        reference_point = self.qdrant.retrieve(collection_name=self.collection_name, ids=[hash(reference_image_id)])[0]
+        reference_id = stable_point_id(reference_image_id)
+        reference_point = self.qdrant.retrieve(
+            collection_name=self.collection_name, ids=[reference_id], with_vectors=True
+        )[0]
 
         # Search for similar images
         search_results = self.qdrant.search(
@@ -143,6 +262,7 @@ class ImageRecommendationService:
             query_vector=reference_point.vector,
             limit=limit + 1,  # +1 for next token
             offset=int(prev_token) if prev_token else 0,
+            search_params=search_params(profile),
         )
 
         # Process results
@@ -151,7 +271,7 @@ class ImageRecommendationService:
 
         for i, result in enumerate(search_results):
             # Skip the reference image itself
-            if result.id == hash(reference_image_id):
+            if str(result.id) == reference_id:
                 continue
 
             if i < limit:
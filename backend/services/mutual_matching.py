@@ -0,0 +1,239 @@
+import argparse
+import logging
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils.qdrant import get_qdrant_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MUTUAL_MATCHES_FIELD = "mutual_matches"
+
+# Normalized vectors shared with worker processes
+_worker_matrix = None
+
+
+def export_vectors(
+    qdrant: QdrantClient, collection_name: str, page_size: int = 1024, using: Optional[str] = None
+) -> Tuple[List[models.ExtendedPointId], List[str], np.ndarray]:
+    """
+    Scroll every point out of a collection.
+
+    Args:
+        using: Named vector to export, for multi-vector collections
+
+    Returns:
+        Point ids, user ids and an L2-normalized float32 matrix of their vectors
+    """
+    point_ids, user_ids, vectors = [], [], []
+    offset = None
+    while True:
+        records, offset = qdrant.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=["id"],
+            with_vectors=[using] if using else True,
+        )
+        for record in records:
+            point_ids.append(record.id)
+            user_ids.append(record.payload.get("id"))
+            vectors.append(record.vector[using] if using else record.vector)
+        if offset is None:
+            break
+
+    if not vectors:
+        return point_ids, user_ids, np.empty((0, 0), dtype=np.float32)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return point_ids, user_ids, matrix / np.maximum(norms, 1e-12)
+
+
+def _init_worker(matrix: np.ndarray):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+
+def _keep_top_k(indices: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k highest-scoring candidates of every row (unordered)"""
+    if scores.shape[1] <= k:
+        return indices, scores
+    keep = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+    return np.take_along_axis(indices, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+
+
+def _block_top_k(args: Tuple[int, int, int, int]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Top-k cosine neighbours for rows [start, stop), excluding each row itself.
+
+    Columns are scored in tiles and merged into a running top-k, so at most a
+    rows x column_block tile of scores is held at a time.
+    """
+    start, stop, k, column_block = args
+    n = _worker_matrix.shape[0]
+    rows = _worker_matrix[start:stop]
+    best_indices = np.empty((stop - start, 0), dtype=np.int64)
+    best_scores = np.empty((stop - start, 0), dtype=np.float32)
+
+    for column_start in range(0, n, column_block):
+        column_stop = min(column_start + column_block, n)
+        scores = rows @ _worker_matrix[column_start:column_stop].T
+
+        # Mask the diagonal where the tile overlaps the row block
+        overlap = np.arange(max(start, column_start), min(stop, column_stop))
+        scores[overlap - start, overlap - column_start] = -np.inf
+
+        tile_indices, tile_scores = _keep_top_k(
+            np.broadcast_to(np.arange(column_start, column_stop), scores.shape), scores, k
+        )
+        best_indices, best_scores = _keep_top_k(
+            np.concatenate([best_indices, tile_indices], axis=1), np.concatenate([best_scores, tile_scores], axis=1), k
+        )
+
+    order = np.argsort(best_scores, axis=1)[:, ::-1]
+    return start, np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def top_k_neighbors(
+    matrix: np.ndarray, k: int = 20, block_size: int = 2048, workers: int = 1, column_block: int = 8192
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute top-k neighbours of every row with blocked matrix multiplication.
+
+    Only a block_size x column_block score tile (plus its partition indices) is
+    materialized per worker at a time, independent of N.
+
+    Returns:
+        Neighbour indices and similarities, both of shape (N, k), best first
+    """
+    n = matrix.shape[0]
+    k = max(min(k, n - 1), 0)
+    indices = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    blocks = [(start, min(start + block_size, n), k, column_block) for start in range(0, n, block_size)]
+    if workers > 1:
+        with Pool(workers, initializer=_init_worker, initargs=(matrix,)) as pool:
+            results = pool.imap_unordered(_block_top_k, blocks)
+            for start, block_indices, block_scores in results:
+                indices[start : start + len(block_indices)] = block_indices
+                scores[start : start + len(block_scores)] = block_scores
+    else:
+        _init_worker(matrix)
+        for block in blocks:
+            start, block_indices, block_scores = _block_top_k(block)
+            indices[start : start + len(block_indices)] = block_indices
+            scores[start : start + len(block_scores)] = block_scores
+
+    return indices, scores
+
+
+def reciprocal_matches(indices: np.ndarray, scores: np.ndarray) -> Dict[int, List[Tuple[int, float, float]]]:
+    """
+    Keep only pairs that appear in each other's top-k and score them by reciprocal rank.
+
+    The mutual score is the mean of 1/rank in both directions, so a pair that is
+    each other's first choice scores 1.0.
+
+    Returns:
+        Row index -> [(neighbour row, mutual score, similarity)], best mutual score first
+    """
+    n, k = indices.shape
+    if indices.size == 0:
+        return {}
+
+    rows = np.repeat(np.arange(n, dtype=np.int64), k)
+    cols = indices.ravel()
+    ranks = np.tile(np.arange(1, k + 1), n)
+    similarities = scores.ravel()
+
+    # Look up the reverse edge (j -> i) of every forward edge (i -> j)
+    forward = rows * n + cols
+    order = np.argsort(forward)
+    sorted_forward = forward[order]
+    backward = cols * n + rows
+    positions = np.clip(np.searchsorted(sorted_forward, backward), 0, len(sorted_forward) - 1)
+    mutual = sorted_forward[positions] == backward
+    reverse_ranks = ranks[order][positions]
+
+    mutual_scores = 0.5 * (1.0 / ranks + 1.0 / reverse_ranks)
+
+    matches: Dict[int, List[Tuple[int, float, float]]] = {}
+    for i, j, score, similarity in zip(rows[mutual], cols[mutual], mutual_scores[mutual], similarities[mutual]):
+        matches.setdefault(int(i), []).append((int(j), float(score), float(similarity)))
+    for entries in matches.values():
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+    return matches
+
+
+def write_mutual_matches(
+    qdrant: QdrantClient,
+    collection_name: str,
+    point_ids: List[models.ExtendedPointId],
+    user_ids: List[str],
+    matches: Dict[int, List[Tuple[int, float, float]]],
+    batch_size: int = 256,
+):
+    """Store each user's mutual matches in its payload, clearing stale entries"""
+    # Lets /api/users/{id}/mutual look a user up by id without a full scan
+    qdrant.create_payload_index(collection_name, field_name="id", field_schema=models.PayloadSchemaType.KEYWORD)
+
+    operations = []
+    for i, point_id in enumerate(point_ids):
+        entries = [
+            {"point_id": point_ids[j], "user_id": user_ids[j], "score": round(score, 4), "similarity": round(sim, 4)}
+            for j, score, sim in matches.get(i, [])
+        ]
+        operations.append(
+            models.SetPayloadOperation(
+                set_payload=models.SetPayload(payload={MUTUAL_MATCHES_FIELD: entries}, points=[point_id])
+            )
+        )
+        if len(operations) == batch_size:
+            qdrant.batch_update_points(collection_name=collection_name, update_operations=operations)
+            operations = []
+    if operations:
+        qdrant.batch_update_points(collection_name=collection_name, update_operations=operations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute reciprocal top-k user matches for every user")
+    parser.add_argument("--collection", default="user_profiles")
+    parser.add_argument("--k", type=int, default=20, help="Neighbours considered per user")
+    parser.add_argument("--block-size", type=int, default=2048, help="Rows scored per matrix block")
+    parser.add_argument("--column-block", type=int, default=8192, help="Columns scored per tile of a row block")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--vector",
+        default="facets",
+        help="Named vector to compare; the default concatenates all profile facets with equal weight",
+    )
+    args = parser.parse_args()
+
+    qdrant = get_qdrant_client()
+
+    started = time.monotonic()
+    point_ids, user_ids, matrix = export_vectors(qdrant, args.collection, using=args.vector)
+    logger.info(f"Exported {len(point_ids)} vectors in {time.monotonic() - started:.1f}s")
+
+    indices, scores = top_k_neighbors(
+        matrix, k=args.k, block_size=args.block_size, workers=args.workers, column_block=args.column_block
+    )
+    matches = reciprocal_matches(indices, scores)
+    logger.info(f"Found mutual matches for {len(matches)} users in {time.monotonic() - started:.1f}s")
+
+    write_mutual_matches(qdrant, args.collection, point_ids, user_ids, matches)
+    logger.info(f"Wrote mutual matches in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
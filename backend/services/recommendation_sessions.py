@@ -0,0 +1,139 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+
+class RecommendationSession:
+    """Server-side browsing state: seed, liked/skipped history and every image already shown"""
+
+    def __init__(self, seed_vector: Optional[List[float]], seed_ids: List[Any], max_history: int, max_seen: int):
+        self.seed_vector = seed_vector
+        self.liked = deque(seed_ids, maxlen=max_history)
+        self.skipped = deque(maxlen=max_history)
+        self.max_seen = max_seen
+        # Insertion-ordered set, so the oldest ids are dropped first once it is full
+        self.seen = dict.fromkeys(seed_ids)
+        self.lock = threading.Lock()
+        self.touched = time.monotonic()
+
+    def mark_seen(self, image_ids: Iterable[Any]):
+        for image_id in image_ids:
+            self.seen.pop(image_id, None)
+            self.seen[image_id] = None
+        while len(self.seen) > self.max_seen:
+            del self.seen[next(iter(self.seen))]
+
+
+class SessionRecommendationService:
+    """
+    Sequential recommendations driven by a user's likes and skips.
+
+    Each page is a single Qdrant recommend query: liked images (plus the session's
+    seed) are positive examples, skipped ones negative, and everything already shown
+    is excluded by a has_id filter, so clients never merge several searches.
+    """
+
+    def __init__(
+        self,
+        qdrant: QdrantClient,
+        collection_name: str,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 1800.0,
+        max_history: int = 50,
+        max_seen: int = 5000,
+    ):
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.max_seen = max_seen
+
+        self._sessions: "OrderedDict[str, RecommendationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create_session(self, seed_vector: Optional[np.ndarray] = None, seed_ids: Optional[List[Any]] = None) -> str:
+        """Start a session from an uploaded image's embedding and/or existing image ids"""
+        session = RecommendationSession(
+            seed_vector.tolist() if seed_vector is not None else None,
+            list(seed_ids or []),
+            self.max_history,
+            self.max_seen,
+        )
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_expired()
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.touched >= cutoff:
+                break
+            del self._sessions[session_id]
+
+    def _get(self, session_id: str) -> RecommendationSession:
+        """
+        Raises:
+            KeyError: If the session does not exist or has expired
+        """
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions[session_id]
+            session.touched = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def record_feedback(self, session_id: str, image_id: Any, liked: bool):
+        """Record that the user liked or skipped an image"""
+        session = self._get(session_id)
+        with session.lock:
+            # A later opinion replaces an earlier one
+            for history in (session.liked, session.skipped):
+                if image_id in history:
+                    history.remove(image_id)
+            (session.liked if liked else session.skipped).append(image_id)
+            session.mark_seen([image_id])
+
+    def next_page(self, session_id: str, limit: int = 9) -> List[models.ScoredPoint]:
+        """
+        Fetch the next page of unseen recommendations for a session.
+
+        Raises:
+            KeyError: If the session does not exist or has expired
+            ValueError: If the session has no seed, likes or skips to recommend from
+        """
+        session = self._get(session_id)
+        with session.lock:
+            positive = list(session.liked)
+            if session.seed_vector is not None:
+                positive.append(session.seed_vector)
+            negative = list(session.skipped)
+            if not positive and not negative:
+                raise ValueError("Session has no seed image, likes or skips to recommend from")
+
+            # Averaging is one vector search; best-score also handles negatives-only sessions
+            strategy = models.RecommendStrategy.AVERAGE_VECTOR if positive else models.RecommendStrategy.BEST_SCORE
+            seen = list(session.seen)
+            results = self.qdrant.query_points(
+                collection_name=self.collection_name,
+                query=models.RecommendQuery(
+                    recommend=models.RecommendInput(positive=positive, negative=negative, strategy=strategy)
+                ),
+                query_filter=models.Filter(must_not=[models.HasIdCondition(has_id=seen)]) if seen else None,
+                limit=limit,
+                with_payload=True,
+            ).points
+
+            session.mark_seen(result.id for result in results)
+            return results
@@ -0,0 +1,381 @@
+import argparse
+import io
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import requests
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.services.image_fields import DERIVED_FIELD_SCHEMAS, with_derived_fields
+from backend.utils.collections import VectorsConfig
+from backend.utils.dedup import ImageDeduplicator
+from backend.utils.projection import (
+    CLIP_EMBEDDING_SIZE,
+    STORAGE_DATATYPES,
+    project_points,
+    recall_report,
+    storage_config,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CollectionReindexer:
+    """
+    Rebuilds a collection behind a Qdrant alias without touching the live one.
+
+    Points are written into a versioned shadow collection ("<alias>_v<timestamp>")
+    in throttled batches. Once the shadow collection is indexed and passes a recall
+    check, the alias is switched over in a single atomic alias update.
+    """
+
+    def __init__(
+        self,
+        qdrant: QdrantClient,
+        alias: str,
+        vectors_config: VectorsConfig,
+        batch_size: int = 64,
+        max_points_per_second: Optional[float] = 200.0,
+        payload_indexes: Optional[Dict[str, models.PayloadSchemaType]] = None,
+        **collection_kwargs,
+    ):
+        self.qdrant = qdrant
+        self.alias = alias
+        self.vectors_config = vectors_config
+        self.payload_indexes = payload_indexes or {}
+        self.batch_size = batch_size
+        self.max_points_per_second = max_points_per_second
+        self.collection_kwargs = collection_kwargs
+
+        self.shadow_name = f"{alias}_v{int(time.time())}"
+        self.status: Dict[str, Any] = {"state": "idle", "collection": self.shadow_name, "points": 0, "error": None}
+        self._thread: Optional[threading.Thread] = None
+
+    def current_collection(self) -> Optional[str]:
+        """Name of the collection the alias currently points to, if any"""
+        for alias in self.qdrant.get_aliases().aliases:
+            if alias.alias_name == self.alias:
+                return alias.collection_name
+        return None
+
+    def _batches(self, points: Iterable[models.PointStruct]) -> Iterator[List[models.PointStruct]]:
+        batch = []
+        for point in points:
+            batch.append(point)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def build(self, points: Iterable[models.PointStruct]) -> int:
+        """Create the shadow collection and ingest points into it at a bounded rate"""
+        self.status["state"] = "building"
+        self.qdrant.create_collection(
+            collection_name=self.shadow_name, vectors_config=self.vectors_config, **self.collection_kwargs
+        )
+        for field_name, field_schema in self.payload_indexes.items():
+            self.qdrant.create_payload_index(self.shadow_name, field_name=field_name, field_schema=field_schema)
+
+        started = time.monotonic()
+        for batch in self._batches(points):
+            # Send vectors as one contiguous float32 array (per named vector) instead of per-point lists
+            if isinstance(batch[0].vector, dict):
+                vectors = {
+                    name: np.asarray([point.vector[name] for point in batch], dtype=np.float32)
+                    for name in batch[0].vector
+                }
+            else:
+                vectors = np.asarray([point.vector for point in batch], dtype=np.float32)
+            self.qdrant.upload_collection(
+                collection_name=self.shadow_name,
+                vectors=vectors,
+                payload=[point.payload for point in batch],
+                ids=[point.id for point in batch],
+                batch_size=len(batch),
+                wait=True,
+            )
+            self.status["points"] += len(batch)
+
+            # Sleep off any lead over the target rate so live traffic keeps its headroom
+            if self.max_points_per_second:
+                lead = self.status["points"] / self.max_points_per_second - (time.monotonic() - started)
+                if lead > 0:
+                    time.sleep(lead)
+
+        self._wait_until_indexed()
+        return self.status["points"]
+
+    def _wait_until_indexed(self, timeout: float = 600.0, poll_interval: float = 1.0):
+        """Block until Qdrant has finished optimizing the shadow collection"""
+        deadline = time.monotonic() + timeout
+        while self.qdrant.get_collection(self.shadow_name).status != models.CollectionStatus.GREEN:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Collection '{self.shadow_name}' was not indexed within {timeout}s")
+            time.sleep(poll_interval)
+
+    def validate_recall(self, sample_size: int = 50, k: int = 10, using: Optional[str] = None) -> float:
+        """
+        Measure HNSW recall@k of the shadow collection against exact search on a sample.
+
+        Args:
+            sample_size: Number of stored points to use as queries
+            k: Number of neighbours to compare
+            using: Named vector to check, for multi-vector collections
+        """
+        self.status["state"] = "validating"
+        sample, _ = self.qdrant.scroll(
+            collection_name=self.shadow_name, limit=sample_size, with_payload=False, with_vectors=True
+        )
+        if not sample:
+            return 0.0
+
+        recalls = []
+        for point in sample:
+            vector = point.vector[using] if using else point.vector
+            approx, exact = (
+                self.qdrant.query_points(
+                    collection_name=self.shadow_name,
+                    query=vector,
+                    using=using,
+                    limit=k,
+                    search_params=models.SearchParams(exact=is_exact),
+                ).points
+                for is_exact in (False, True)
+            )
+            exact_ids = {hit.id for hit in exact}
+            if exact_ids:
+                recalls.append(len(exact_ids & {hit.id for hit in approx}) / len(exact_ids))
+
+        return sum(recalls) / len(recalls) if recalls else 0.0
+
+    def is_legacy_collection(self) -> bool:
+        """Whether the alias name is still a concrete collection rather than an alias"""
+        if self.current_collection():
+            return False
+        return self.alias in {collection.name for collection in self.qdrant.get_collections().collections}
+
+    def swap(self, replace_legacy: bool = False) -> Optional[str]:
+        """
+        Point the alias at the shadow collection and return the collection it replaced
+
+        Raises:
+            ValueError: If the alias name is a concrete collection and replace_legacy is not set
+        """
+        previous = self.current_collection()
+        operations = []
+        if previous:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=self.alias)))
+        elif self.is_legacy_collection():
+            if not replace_legacy:
+                raise ValueError(
+                    f"'{self.alias}' is a concrete collection; pass replace_legacy to delete it and create the alias"
+                )
+            # Legacy layout: the alias name is still a concrete collection. Qdrant cannot
+            # replace a collection with an alias atomically, so this first cut-over has a
+            # short gap; every later swap is a single alias update.
+            logger.warning(f"Deleting concrete collection '{self.alias}' to replace it with an alias")
+            self.qdrant.delete_collection(self.alias)
+
+        operations.append(
+            models.CreateAliasOperation(
+                create_alias=models.CreateAlias(collection_name=self.shadow_name, alias_name=self.alias)
+            )
+        )
+        self.qdrant.update_collection_aliases(change_aliases_operations=operations)
+        return previous
+
+    def run(
+        self,
+        points: Iterable[models.PointStruct],
+        min_recall: float = 0.95,
+        drop_previous: bool = False,
+        using: Optional[str] = None,
+        replace_legacy: bool = False,
+    ) -> Dict[str, Any]:
+        """Build, validate and swap; the shadow collection is dropped if validation fails"""
+        try:
+            # Fail before building rather than at the swap
+            if not replace_legacy and self.is_legacy_collection():
+                raise ValueError(
+                    f"'{self.alias}' is a concrete collection; pass replace_legacy to delete it and create the alias"
+                )
+            self.build(points)
+            recall = self.validate_recall(using=using)
+            self.status["recall"] = recall
+            if recall < min_recall:
+                self.qdrant.delete_collection(self.shadow_name)
+                raise ValueError(f"Recall {recall:.3f} is below the required {min_recall:.3f}")
+
+            previous = self.swap(replace_legacy=replace_legacy)
+            self.status.update(state="swapped", previous=previous)
+            if previous and drop_previous:
+                self.qdrant.delete_collection(previous)
+        except Exception as e:
+            self.status.update(state="failed", error=str(e))
+            logger.error(f"Reindex of '{self.alias}' failed: {str(e)}")
+            raise
+        return self.status
+
+    def start(self, points: Iterable[models.PointStruct], **run_kwargs) -> threading.Thread:
+        """Run the full reindex in a background thread; progress is exposed through status"""
+
+        def target():
+            try:
+                self.run(points, **run_kwargs)
+            except Exception:
+                pass  # Already recorded in status
+
+        self._thread = threading.Thread(target=target, name=f"reindex-{self.alias}", daemon=True)
+        self._thread.start()
+        return self._thread
+
+
+def _user_points(service, page_size: int = 256) -> Iterator[models.PointStruct]:
+    """
+    Re-embed every user of the live collection, keeping ids and extra payload such as mutual matches.
+
+    Falls back to the seed data file when the collection does not exist yet.
+    """
+    from backend.models.user import User
+
+    try:
+        service.qdrant.get_collection(service.collection_name)
+    except Exception:
+        with open(Path("data/users.json"), "r") as f:
+            users_data = json.load(f)
+        for user in users_data["users"]:
+            yield service.build_point(User(**user))
+        return
+
+    offset = None
+    while True:
+        records, offset = service.qdrant.scroll(
+            collection_name=service.collection_name, limit=page_size, offset=offset, with_payload=True
+        )
+        for record in records:
+            payload = record.payload or {}
+            point = service.build_point(User(**payload))
+            yield models.PointStruct(id=record.id, vector=point.vector, payload={**payload, **point.payload})
+        if offset is None:
+            break
+
+
+def _image_points(
+    service, page_size: int = 256, deduplicator: Optional[ImageDeduplicator] = None
+) -> Iterator[models.PointStruct]:
+    """Re-embed every image of the live collection from its image URL, keeping ids and payloads"""
+    offset = None
+    while True:
+        records, offset = service.qdrant.scroll(
+            collection_name=service.collection_name, limit=page_size, offset=offset, with_vectors=True
+        )
+        for record in records:
+            payload = record.payload or {}
+            image_url = payload.get("image_url")
+            if image_url:
+                response = requests.get(image_url, timeout=30)
+                response.raise_for_status()
+
+                # Drop exact and near duplicates before spending a CLIP pass on them
+                if deduplicator:
+                    fingerprint = deduplicator.fingerprint(response.content)
+                    if deduplicator.check(fingerprint):
+                        continue
+                    deduplicator.add(fingerprint, record.id)
+
+                started = time.perf_counter()
+                vector = service._generate_image_embedding(io.BytesIO(response.content)).tolist()
+                if deduplicator:
+                    deduplicator.record_embedding(time.perf_counter() - started)
+            elif len(record.vector) == CLIP_EMBEDDING_SIZE:
+                logger.warning(f"Point {record.id} has no image_url, keeping its stored vector")
+                vector = record.vector
+            else:
+                logger.warning(f"Point {record.id} has no image_url and only a projected vector, skipping it")
+                continue
+            yield models.PointStruct(id=record.id, vector=vector, payload=with_derived_fields(payload))
+        if offset is None:
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a collection behind an alias with zero downtime")
+    parser.add_argument("target", choices=["users", "images"])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rate", type=float, default=200.0, help="Max points per second, 0 for unthrottled")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--drop-previous", action="store_true", help="Delete the old collection after the swap")
+    parser.add_argument(
+        "--replace-legacy",
+        action="store_true",
+        help="Delete a concrete collection named like the alias so the alias can replace it (short gap)",
+    )
+    parser.add_argument("--dedup", action="store_true", help="Skip exact and near duplicate images")
+    parser.add_argument("--dims", type=int, help="Reduce vectors to this many dimensions with PCA")
+    parser.add_argument("--storage", choices=list(STORAGE_DATATYPES), default="float32")
+    parser.add_argument("--fit-sample", type=int, default=5000, help="Points used to fit the projection")
+    args = parser.parse_args()
+
+    if args.target == "users":
+        from backend.services.user_matching import UserMatchingService
+
+        service = UserMatchingService(initialize_collection=False)
+        points = _user_points(service)
+        payload_indexes = None
+    else:
+        from backend.services.image_recommendation import ImageRecommendationService
+
+        service = ImageRecommendationService(initialize_collection=False)
+        deduplicator = ImageDeduplicator() if args.dedup else None
+        points = _image_points(service, deduplicator=deduplicator)
+        payload_indexes = DERIVED_FIELD_SCHEMAS
+
+    # Rebuild from raw CLIP embeddings; a new projection is fitted on them below
+    service.projection = None
+    points, projection, sample = project_points(points, args.dims, args.fit_sample)
+    service.projection = projection
+    vectors_config = service.vectors_config(args.storage)
+    # project_points projects the rest of the stream, so the service must keep embedding raw vectors
+    service.projection = None
+    _, collection_kwargs = storage_config(projection.dims if projection else CLIP_EMBEDDING_SIZE, args.storage)
+    report = recall_report(sample, projection, args.storage)
+    logger.info(f"Projection recall report: {report}")
+
+    reindexer = CollectionReindexer(
+        service.qdrant,
+        alias=service.collection_name,
+        vectors_config=vectors_config,
+        batch_size=args.batch_size,
+        max_points_per_second=args.rate or None,
+        payload_indexes=payload_indexes,
+        **collection_kwargs,
+    )
+    if projection:
+        # Services load it for whichever collection the alias points to at startup
+        projection.save(reindexer.shadow_name)
+
+    # Check recall on the first searchable named vector of multi-vector collections
+    using = next(iter(vectors_config)) if isinstance(vectors_config, dict) else None
+    status = reindexer.run(
+        points,
+        min_recall=args.min_recall,
+        drop_previous=args.drop_previous,
+        using=using,
+        replace_legacy=args.replace_legacy,
+    )
+    status["projection"] = report
+    if args.target == "images" and deduplicator:
+        status["dedup"] = deduplicator.report()
+    print(json.dumps(status, indent=2))
+
+
+if __name__ == "__main__":
+    main()
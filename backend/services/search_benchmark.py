@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from backend.utils.search_profiles import SEARCH_PROFILES, search_params
+from backend.utils.sharding import client_for_collection
+
+
+def sample_queries(
+    qdrant: QdrantClient, collection_name: str, size: int, using: Optional[str] = None
+) -> List[List[float]]:
+    """Use stored vectors as benchmark queries"""
+    records, _ = qdrant.scroll(
+        collection_name=collection_name, limit=size, with_payload=False, with_vectors=[using] if using else True
+    )
+    return [record.vector[using] if using else record.vector for record in records]
+
+
+def benchmark(
+    qdrant: QdrantClient,
+    collection_name: str,
+    queries: List[List[float]],
+    k: int = 10,
+    using: Optional[str] = None,
+    auto_budgets_ms: Sequence[float] = (1000.0, 100.0),
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Time every search profile on the same queries and compare them with exact search.
+
+    Modes run in a shuffled order per query so caches favour none of them. "auto"
+    is measured once per budget, with the deadline starting when the query is sent.
+
+    Returns:
+        Per mode: latency percentiles, recall@k against exact search and the mean
+        latency saved compared with exact search and with the collection defaults
+    """
+    modes = {"default": lambda: None}
+    modes.update({name: (lambda name=name: search_params(name)) for name in SEARCH_PROFILES})
+    for budget in auto_budgets_ms:
+        modes[f"auto@{budget:g}ms"] = lambda budget=budget: search_params("auto", time.monotonic() + budget / 1000)
+
+    rng = random.Random(seed)
+    latencies: Dict[str, List[float]] = {mode: [] for mode in modes}
+    recalls: Dict[str, List[float]] = {mode: [] for mode in modes}
+    for query in queries:
+        hits = {}
+        order = list(modes)
+        rng.shuffle(order)
+        for mode in order:
+            started = time.perf_counter()
+            points = qdrant.query_points(
+                collection_name=collection_name, query=query, using=using, limit=k, search_params=modes[mode]()
+            ).points
+            latencies[mode].append((time.perf_counter() - started) * 1000)
+            hits[mode] = {point.id for point in points}
+
+        exact_ids = hits["exact"]
+        for mode in modes:
+            if exact_ids:
+                recalls[mode].append(len(hits[mode] & exact_ids) / len(exact_ids))
+
+    mean_exact = float(np.mean(latencies["exact"])) if queries else 0.0
+    mean_default = float(np.mean(latencies["default"])) if queries else 0.0
+    report = {}
+    for mode, values in latencies.items():
+        if not values:
+            continue
+        mean = float(np.mean(values))
+        report[mode] = {
+            "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "mean_ms": round(mean, 3),
+            f"recall@{k}": round(float(np.mean(recalls[mode])), 4) if recalls[mode] else None,
+            "saved_vs_exact_ms": round(mean_exact - mean, 3),
+            "saved_vs_exact_pct": round(100 * (mean_exact - mean) / mean_exact, 1) if mean_exact else None,
+            "saved_vs_default_ms": round(mean_default - mean, 3),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare latency and recall of the search profiles")
+    parser.add_argument("collection", help="Collection or alias, e.g. midjourney-images or user_profiles")
+    parser.add_argument("--queries", type=int, default=100, help="Stored vectors used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--using", help="Named vector to search, e.g. interests for user_profiles")
+    parser.add_argument(
+        "--auto-budget-ms",
+        type=float,
+        nargs="+",
+        default=[1000.0, 100.0],
+        help="Remaining deadlines to benchmark the auto profile with",
+    )
+    args = parser.parse_args()
+
+    qdrant = client_for_collection(args.collection)
+    queries = sample_queries(qdrant, args.collection, args.queries, args.using)
+    report = benchmark(
+        qdrant, args.collection, queries, k=args.k, using=args.using, auto_budgets_ms=args.auto_budget_ms
+    )
+    print(json.dumps({"collection": args.collection, "queries": len(queries), "modes": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils.projection import EmbeddingProjection
+from backend.utils.qdrant import is_embedded
+from backend.utils.sharding import client_for_collection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_DIR = Path("data/snapshots")
+MANIFEST_FILE = "manifest.json"
+PAYLOADS_FILE = "payloads.parquet"
+PROJECTION_FILE = "projection.npz"
+# File name used for the vector of single-vector collections
+DEFAULT_VECTOR = "default"
+
+PAYLOAD_SCHEMA = pa.schema([("id", pa.string()), ("payload", pa.string())])
+
+QUANTIZATION_TYPES = {
+    "scalar": models.ScalarQuantization,
+    "product": models.ProductQuantization,
+    "binary": models.BinaryQuantization,
+}
+
+
+def _vector_params(collection: models.CollectionInfo) -> Dict[str, models.VectorParams]:
+    vectors = collection.config.params.vectors
+    return vectors if isinstance(vectors, dict) else {DEFAULT_VECTOR: vectors}
+
+
+def _parse_point_id(value: str) -> Union[int, str]:
+    """Qdrant point ids are unsigned integers or UUID strings"""
+    return int(value) if value.isdigit() else value
+
+
+def export_snapshot(
+    qdrant: QdrantClient, collection_name: str, directory: Path, page_size: int = 2048
+) -> Dict[str, Any]:
+    """
+    Stream every point of a collection into a columnar snapshot directory.
+
+    Vectors go to one float32 .npy file per named vector, written through a memory
+    map; ids and JSON payloads go to a Parquet file with one row group per page.
+
+    Returns:
+        The snapshot manifest
+    """
+    collection = qdrant.get_collection(collection_name)
+    params = _vector_params(collection)
+    expected = qdrant.count(collection_name, exact=True).count
+
+    directory.mkdir(parents=True, exist_ok=True)
+    matrices = {
+        name: np.lib.format.open_memmap(
+            directory / f"{name}.npy", mode="w+", dtype=np.float32, shape=(expected, vector.size)
+        )
+        for name, vector in params.items()
+    }
+
+    # Points upserted after the count are left out; deleted ones leave unused rows
+    written = 0
+    offset = None
+    with pq.ParquetWriter(directory / PAYLOADS_FILE, PAYLOAD_SCHEMA) as writer:
+        while written < expected:
+            records, offset = qdrant.scroll(
+                collection_name=collection_name,
+                limit=min(page_size, expected - written),
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if not records:
+                break
+            for name, matrix in matrices.items():
+                rows = [record.vector[name] if name != DEFAULT_VECTOR else record.vector for record in records]
+                matrix[written : written + len(records)] = np.asarray(rows, dtype=np.float32)
+            writer.write_table(
+                pa.table(
+                    {
+                        "id": [str(record.id) for record in records],
+                        "payload": [json.dumps(record.payload or {}) for record in records],
+                    },
+                    schema=PAYLOAD_SCHEMA,
+                )
+            )
+            written += len(records)
+            if offset is None:
+                break
+
+    for matrix in matrices.values():
+        matrix.flush()
+
+    projection = EmbeddingProjection.for_collection(qdrant, collection_name)
+    if projection:
+        np.savez(directory / PROJECTION_FILE, mean=projection.mean, components=projection.components)
+
+    manifest = {
+        "collection": collection_name,
+        "created": time.time(),
+        "points": written,
+        "vectors": {name: vector.model_dump(mode="json", exclude_none=True) for name, vector in params.items()},
+        "named_vectors": isinstance(collection.config.params.vectors, dict),
+        "quantization": (
+            collection.config.quantization_config.model_dump(mode="json", exclude_none=True)
+            if collection.config.quantization_config
+            else None
+        ),
+        "payload_indexes": {
+            field: schema.data_type.value for field, schema in (collection.payload_schema or {}).items()
+        },
+        "projection": projection.version if projection else None,
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_snapshot(directory: Path) -> Tuple[Dict[str, Any], Dict[str, np.ndarray], pa.Table]:
+    """
+    Open a snapshot for offline analysis (kNN, PCA, ...) without loading vectors into RAM.
+
+    Returns:
+        (manifest, read-only memory-mapped vectors per name, id/payload table)
+    """
+    manifest = json.loads((directory / MANIFEST_FILE).read_text())
+    vectors = {
+        name: np.load(directory / f"{name}.npy", mmap_mode="r")[: manifest["points"]] for name in manifest["vectors"]
+    }
+    return manifest, vectors, pq.read_table(directory / PAYLOADS_FILE)
+
+
+def restore_snapshot(
+    qdrant: QdrantClient,
+    directory: Path,
+    collection_name: Optional[str] = None,
+    batch_size: int = 512,
+    workers: int = 4,
+    recreate: bool = False,
+) -> int:
+    """
+    Bulk-load a snapshot into a new collection with parallel batched upserts.
+
+    Embedded Qdrant handles one call at a time, so it is loaded with a single worker.
+
+    Raises:
+        ValueError: If the collection already exists and recreate is not set
+
+    Returns:
+        Number of points restored
+    """
+    manifest, vectors, _ = load_snapshot(directory)
+    collection_name = collection_name or manifest["collection"]
+    if workers > 1 and is_embedded(qdrant):
+        logger.info("Embedded Qdrant is not thread-safe, restoring with one worker")
+        workers = 1
+
+    if qdrant.collection_exists(collection_name):
+        if not recreate:
+            raise ValueError(f"Collection '{collection_name}' already exists; pass recreate to replace it")
+        qdrant.delete_collection(collection_name)
+
+    params = {name: models.VectorParams(**config) for name, config in manifest["vectors"].items()}
+    quantization = manifest.get("quantization")
+    qdrant.create_collection(
+        collection_name=collection_name,
+        vectors_config=params if manifest["named_vectors"] else params[DEFAULT_VECTOR],
+        quantization_config=QUANTIZATION_TYPES[next(iter(quantization))](**quantization) if quantization else None,
+    )
+    for field_name, field_schema in manifest["payload_indexes"].items():
+        qdrant.create_payload_index(
+            collection_name, field_name=field_name, field_schema=models.PayloadSchemaType(field_schema)
+        )
+
+    projection_path = directory / PROJECTION_FILE
+    if projection_path.exists():
+        with np.load(projection_path) as data:
+            EmbeddingProjection(data["mean"], data["components"]).save(collection_name)
+
+    def upsert(start: int, ids: List[str], payloads: List[str]):
+        stop = start + len(ids)
+        if manifest["named_vectors"]:
+            batch_vectors = {name: matrix[start:stop].tolist() for name, matrix in vectors.items()}
+        else:
+            batch_vectors = vectors[DEFAULT_VECTOR][start:stop].tolist()
+        qdrant.upsert(
+            collection_name=collection_name,
+            points=models.Batch(
+                ids=[_parse_point_id(point_id) for point_id in ids],
+                vectors=batch_vectors,
+                payloads=[json.loads(payload) for payload in payloads],
+            ),
+            wait=True,
+        )
+
+    restored = 0
+    payload_file = pq.ParquetFile(directory / PAYLOADS_FILE)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in payload_file.iter_batches(batch_size=batch_size):
+            # Bound in-flight batches so a large snapshot is never read into memory at once
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(
+                executor.submit(upsert, restored, batch.column("id").to_pylist(), batch.column("payload").to_pylist())
+            )
+            restored += batch.num_rows
+        for future in pending:
+            future.result()
+
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export collections to columnar snapshots and restore them")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write a collection to a snapshot directory")
+    export_parser.add_argument("collection", help="Collection or alias, e.g. user_profiles or midjourney-images")
+    export_parser.add_argument("--out", type=Path, help="Snapshot directory (default: data/snapshots/<name>-<time>)")
+    export_parser.add_argument("--page-size", type=int, default=2048)
+
+    restore_parser = commands.add_parser("restore", help="Bulk-load a snapshot directory into Qdrant")
+    restore_parser.add_argument("snapshot", type=Path)
+    restore_parser.add_argument("--collection", help="Target collection (default: the exported one)")
+    restore_parser.add_argument("--batch-size", type=int, default=512)
+    restore_parser.add_argument("--workers", type=int, default=4)
+    restore_parser.add_argument("--recreate", action="store_true", help="Replace the collection if it exists")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    if args.command == "export":
+        qdrant = client_for_collection(args.collection)
+        directory = args.out or SNAPSHOTS_DIR / f"{args.collection}-{time.strftime('%Y%m%d-%H%M%S')}"
+        manifest = export_snapshot(qdrant, args.collection, directory, page_size=args.page_size)
+        logger.info(f"Exported {manifest['points']} points to {directory} in {time.monotonic() - started:.1f}s")
+    else:
+        collection_name = args.collection or json.loads((args.snapshot / MANIFEST_FILE).read_text())["collection"]
+        qdrant = client_for_collection(collection_name)
+        restored = restore_snapshot(
+            qdrant,
+            args.snapshot,
+            collection_name=collection_name,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            recreate=args.recreate,
+        )
+        logger.info(f"Restored {restored} points in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+
+class SourceTooLarge(ValueError):
+    """Raised when an original image exceeds the download or pixel limit"""
+
+
+class ThumbnailService:
+    """
+    Fetches original images, renders WebP thumbnails and caches them on disk with LRU eviction.
+
+    Remote originals are only fetched from allowed hosts (or URLs confirmed by
+    is_indexed_url, whose host is then allowed), without following redirects,
+    and downloads stop as soon as they exceed max_source_bytes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "data/thumbnails",
+        local_root: str = "data/images",
+        max_cache_bytes: int = 256 * 1024 * 1024,
+        pool_size: int = 16,
+        timeout: float = 10.0,
+        quality: int = 80,
+        allowed_hosts: Optional[Iterable[str]] = None,
+        is_indexed_url: Optional[Callable[[str], bool]] = None,
+        max_source_bytes: int = 20 * 1024 * 1024,
+        max_source_pixels: int = 50_000_000,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.local_root = Path(local_root).resolve()
+        self.max_cache_bytes = max_cache_bytes
+        self.timeout = timeout
+        self.quality = quality
+        self.allowed_hosts = {host.lower() for host in allowed_hosts or ()}
+        self.is_indexed_url = is_indexed_url
+        self.max_source_bytes = max_source_bytes
+        self.max_source_pixels = max_source_pixels
+
+        # Pooled HTTP client shared by all thumbnail requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Cache index in LRU order (oldest first), rebuilt from disk on startup
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._cache_bytes = 0
+        self._load_cache_index()
+
+    def _load_cache_index(self):
+        """Rebuild the LRU index from files already on disk, ordered by last access"""
+        files = sorted(self.cache_dir.glob("*.webp"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path] = size
+            self._cache_bytes += size
+
+    @staticmethod
+    def etag(source: str, size: int) -> str:
+        """Stable ETag for a thumbnail of a given source and size"""
+        return hashlib.sha256(f"{source}|{size}".encode()).hexdigest()[:32]
+
+    def allow_url(self, url: str):
+        """Allow thumbnails of images on the host of an indexed image URL"""
+        host = urlparse(url).hostname
+        if host:
+            self.allowed_hosts.add(host.lower())
+
+    def _download(self, url: str) -> bytes:
+        """Download an original from an allowed host, stopping at max_source_bytes"""
+        host = (urlparse(url).hostname or "").lower()
+        if host not in self.allowed_hosts:
+            if not (host and self.is_indexed_url and self.is_indexed_url(url)):
+                raise ValueError(f"Host is not allowed: {host or url}")
+            self.allowed_hosts.add(host)
+
+        with self.session.get(url, timeout=self.timeout, stream=True, allow_redirects=False) as response:
+            if response.is_redirect:
+                raise ValueError(f"Source redirects elsewhere: {url}")
+            response.raise_for_status()
+            if int(response.headers.get("Content-Length") or 0) > self.max_source_bytes:
+                raise SourceTooLarge(f"Source is larger than {self.max_source_bytes} bytes")
+
+            chunks, received = [], 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                received += len(chunk)
+                if received > self.max_source_bytes:
+                    raise SourceTooLarge(f"Source is larger than {self.max_source_bytes} bytes")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _read_original(self, source: str) -> bytes:
+        """Read the original image from an allowed HTTP(S) URL or a file under local_root"""
+        if source.startswith(("http://", "https://")):
+            return self._download(source)
+
+        path = Path(source.removeprefix("file://")).resolve()
+        if not path.is_relative_to(self.local_root):
+            raise ValueError(f"Source is outside the image directory: {source}")
+        return path.read_bytes()
+
+    def _render(self, original: bytes, size: int) -> bytes:
+        """Downscale an image to fit in a size x size box and encode it as WebP"""
+        image = Image.open(io.BytesIO(original))
+        # The header is parsed lazily, so oversized images are rejected before decoding
+        if image.width * image.height > self.max_source_pixels:
+            raise SourceTooLarge(f"Source has more than {self.max_source_pixels} pixels")
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=self.quality)
+        return buffer.getvalue()
+
+    def _store(self, path: Path, data: bytes):
+        """Write a thumbnail to disk and evict least recently used entries over budget"""
+        # Each writer gets its own temp file, so concurrent misses for one key never publish a partial file
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._cache_bytes += len(data) - self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            while self._cache_bytes > self.max_cache_bytes and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._cache_bytes -= old_size
+                old_path.unlink(missing_ok=True)
+
+    def get_cached(self, source: str, size: int) -> Optional[bytes]:
+        """Return a cached thumbnail, or None on a miss"""
+        path = self.cache_dir / f"{self.etag(source, size)}.webp"
+
+        with self._lock:
+            cached = path in self._entries
+            if cached:
+                self._entries.move_to_end(path)
+
+        if cached:
+            try:
+                data = path.read_bytes()
+                os.utime(path)  # Keep on-disk order in sync for restarts
+                return data
+            except FileNotFoundError:
+                pass  # Evicted by another request in the meantime
+        return None
+
+    def get_thumbnail(self, source: str, size: int) -> Tuple[bytes, str]:
+        """
+        Return a WebP thumbnail and its ETag, rendering and caching it on a miss.
+
+        Args:
+            source: HTTP(S) URL or local path of the original image
+            size: Maximum width and height of the thumbnail in pixels
+
+        Raises:
+            ValueError: If the source is not allowed
+            SourceTooLarge: If the original exceeds the size limits
+        """
+        etag = self.etag(source, size)
+        data = self.get_cached(source, size)
+        if data is None:
+            data = self._render(self._read_original(source), size)
+            self._store(self.cache_dir / f"{etag}.webp", data)
+        return data, etag
@@ -1,48 +1,100 @@
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 from PIL import Image
 import torch
 import logging
 from transformers import CLIPProcessor, CLIPModel
-from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils import profiling
+from backend.utils.qdrant import QdrantSettings, create_qdrant_client, get_qdrant_client
+from backend.utils.search_profiles import resolve_profile, search_params
+from backend.utils.singleflight import SingleFlight, image_digest, normalize_text
+from backend.utils.text_encoding import TextEncoder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class UnifiedSearcher:
-    def __init__(self, host: str = "localhost", port: int = 6333):
-        """Initialize the unified search system with required models and client."""
-        self.client = QdrantClient(host=host, port=port)
-        self.setup_models()
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: int = 6333,
+        clip_model: Optional[CLIPModel] = None,
+        clip_processor: Optional[CLIPProcessor] = None,
+    ):
+        """
+        Initialize the unified search system with required models and client.
+
+        Args:
+            clip_model, clip_processor: Already loaded CLIP model and processor to share,
+                e.g. with the image routes, instead of loading another copy
+        """
+        # Use the shared client unless a specific host is requested
+        if host is None:
+            self.client = get_qdrant_client()
+        else:
+            settings = QdrantSettings.from_env().model_copy(update={"host": host, "port": port})
+            self.client = create_qdrant_client(settings)
+        self.setup_models(clip_model, clip_processor)
         self.collection_name = "multimodal_collection"
+        self.coalescer = SingleFlight("products.search")
 
-    def setup_models(self):
+    def setup_models(self, clip_model: Optional[CLIPModel] = None, clip_processor: Optional[CLIPProcessor] = None):
         """Initialize CLIP and Sentence-Transformer models."""
         try:
-            self.clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-            self.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+            self.clip_model = clip_model or CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+            self.clip_processor = clip_processor or CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+            # Cached, dynamically padded tokenization with the processor's fast tokenizer
+            self.text_encoder = TextEncoder(self.clip_processor.tokenizer)
             logger.info("Models loaded successfully")
         except Exception as e:
             logger.error(f"Error loading models: {str(e)}")
             raise
 
-    def search(self, query: Union[str, Image.Image], top_k: int = 5) -> Dict:
+    def search(
+        self,
+        query: Union[str, Image.Image],
+        top_k: int = 5,
+        profile: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict:
         """
         Unified search function that handles both text and image queries.
 
         Args:
             query: Either a string for text search or PIL Image for image search
             top_k: Number of results to return
+            profile: Search precision ("fast", "balanced", "exact" or "auto")
+            deadline: Monotonic deadline of the request, used by the "auto" profile
 
         Returns:
             Dict containing search results and metadata
         """
+        try:
+            profile = resolve_profile(profile, deadline)
+        except ValueError as e:
+            return {"status": "error", "message": str(e), "results": []}
+
+        # Identical concurrent queries share one embedding and search
+        if isinstance(query, str):
+            query = normalize_text(query)
+            key = ("text", query, top_k, profile)
+        elif isinstance(query, Image.Image):
+            key = ("image", image_digest(query), top_k, profile)
+        else:
+            return self._search(query, top_k, profile)
+        return self.coalescer.do(key, lambda: self._search(query, top_k, profile))
+
+    def _search(self, query: Union[str, Image.Image], top_k: int, profile: Optional[str] = None) -> Dict:
+        """Run a single uncoalesced search."""
         try:
             # Determine query type and process accordingly
+            params = search_params(profile)
             if isinstance(query, str):
-                results = self._search_by_text(query, top_k)
+                results = self._search_by_text(query, top_k, params)
             elif isinstance(query, Image.Image):
-                results = self._search_by_image(query, top_k)
+                results = self._search_by_image(query, top_k, params)
             else:
                 raise ValueError("Query must be either text string or PIL Image")
 
@@ -52,35 +104,45 @@ class UnifiedSearcher:
             logger.error(f"Search error: {str(e)}")
             return {"status": "error", "message": str(e), "results": []}
 
-    def _search_by_text(self, query_text: str, top_k: int) -> List:
+    def _search_by_text(self, query_text: str, top_k: int, params: Optional[models.SearchParams] = None) -> List:
         """Process text search query."""
         # Process text and get embedding
-        inputs = self.clip_processor(text=query_text, return_tensors="pt", padding=True, truncation=True, max_length=77)
+        with profiling.stage("preprocess"):
+            inputs = self.text_encoder.encode([query_text])
 
         # Generate embedding
-        with torch.no_grad():
+        with profiling.stage("embed"), torch.no_grad():
             text_features = self.clip_model.get_text_features(**inputs)
             query_vector = text_features.cpu().numpy().flatten()
 
         # Search in collection
-        search_results = self.client.search(
-            collection_name=self.collection_name, query_vector=query_vector.tolist(), limit=top_k
-        )
+        with profiling.stage("qdrant"):
+            search_results = self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_vector.tolist(),
+                limit=top_k,
+                search_params=params,
+            )
 
         return search_results
 
-    def _search_by_image(self, image: Image.Image, top_k: int) -> List:
+    def _search_by_image(self, image: Image.Image, top_k: int, params: Optional[models.SearchParams] = None) -> List:
         """Process image search query."""
         # Process image and get embedding
-        inputs = self.clip_processor(images=image, return_tensors="pt")
-        with torch.no_grad():
+        with profiling.stage("preprocess"):
+            inputs = self.clip_processor(images=image, return_tensors="pt")
+        with profiling.stage("embed"), torch.no_grad():
             image_features = self.clip_model.get_image_features(**inputs)
             query_vector = image_features.cpu().numpy().flatten()
 
         # Search in collection
-        search_results = self.client.search(
-            collection_name=self.collection_name, query_vector=query_vector.tolist(), limit=top_k
-        )
+        with profiling.stage("qdrant"):
+            search_results = self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_vector.tolist(),
+                limit=top_k,
+                search_params=params,
+            )
 
         return search_results
 
@@ -1,44 +1,104 @@
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from pathlib import Path
 
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from transformers import CLIPTextModel, CLIPTokenizer
+from transformers import CLIPTextModel, CLIPTokenizerFast
 import torch
 import numpy as np
 
-from backend.models.user import User, UserMatch, UserMatchResponse
+from backend.models.user import User, UserMatch, UserMatchResponse, MutualMatch, MutualMatchResponse
+from backend.services.mutual_matching import MUTUAL_MATCHES_FIELD
+from backend.utils import profiling
+from backend.utils.collections import ensure_collection
+from backend.utils.projection import CLIP_EMBEDDING_SIZE, STORAGE_DATATYPES, EmbeddingProjection, ProjectionResolver
+from backend.utils.qdrant import get_qdrant_client
+from backend.utils.search_profiles import resolve_profile, search_params
+from backend.utils.singleflight import SingleFlight, normalize_text
+from backend.utils.streaming import progressive_search_events
+from backend.utils.text_encoding import TextEncoder
+
+# Profile facets, each stored as its own named vector
+FACETS = ("interests", "values", "expertise")
+# Concatenation of the normalized facet vectors; a dot product against weighted
+# copies of the query gives the weighted sum of per-facet cosine similarities
+FACETS_VECTOR = "facets"
+DEFAULT_FACET_WEIGHTS = {"interests": 0.4, "values": 0.3, "expertise": 0.3}
+# Candidates fetched per facet for every requested match before weighted rescoring
+PREFETCH_FACTOR = 4
 
 
 class UserMatchingService:
-    def __init__(self):
+    def __init__(self, initialize_collection: bool = True, qdrant: Optional[QdrantClient] = None):
         # Initialize CLIP model for text embeddings
-        self.tokenizer = CLIPTokenizer.from_pretrained("openai/clip-vit-base-patch32")
+        self.tokenizer = CLIPTokenizerFast.from_pretrained("openai/clip-vit-base-patch32")
         self.model = CLIPTextModel.from_pretrained("openai/clip-vit-base-patch32")
+        self.text_encoder = TextEncoder(self.tokenizer)
 
-        # Initialize Qdrant client
-        self.qdrant = QdrantClient("localhost", port=6333)
+        # Shared Qdrant client unless one is injected (e.g. in-memory for tests)
+        self.qdrant = qdrant or get_qdrant_client()
         self.collection_name = "user_profiles"
+        self._coalescer = SingleFlight("users.find_matches")
+
+        # Optional dimensionality reduction of whichever collection the alias points to
+        self.projections = ProjectionResolver(self.qdrant, self.collection_name)
 
-        # Create collection if it doesn't exist
-        self._initialize_collection()
+        # Offline tools such as reindexing only need the embedding side
+        if initialize_collection:
+            # Create collection if it doesn't exist
+            self._initialize_collection()
 
-        # Load and index users if collection is empty
-        self._load_initial_users()
+            # Load and index users if collection is empty
+            self._load_initial_users()
 
     def _initialize_collection(self):
         """Initialize Qdrant collection for user profiles"""
-        try:
-            self.qdrant.get_collection(self.collection_name)
-        except Exception:
-            self.qdrant.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=512,  # CLIP embedding size
-                    distance=models.Distance.COSINE,
-                ),
-            )
+        ensure_collection(self.qdrant, self.collection_name, self.vectors_config())
+
+    @property
+    def projection(self) -> Optional[EmbeddingProjection]:
+        """Projection of the collection the alias currently points to"""
+        return self.projections.get()
+
+    @projection.setter
+    def projection(self, projection: Optional[EmbeddingProjection]):
+        # Offline tools embed for a collection that is not behind the alias yet
+        self.projections.pin(projection)
+
+    def vectors_config(self, storage: str = "float32") -> Dict[str, models.VectorParams]:
+        """Named vector configuration of the user profile collection"""
+        size = self.projection.dims if self.projection else CLIP_EMBEDDING_SIZE
+        datatype = STORAGE_DATATYPES[storage]
+        config = {
+            facet: models.VectorParams(size=size, distance=models.Distance.COSINE, datatype=datatype)
+            for facet in FACETS
+        }
+        # Only used to rescore prefetched candidates, so it needs no HNSW graph or RAM
+        config[FACETS_VECTOR] = models.VectorParams(
+            size=size * len(FACETS),
+            distance=models.Distance.DOT,
+            datatype=datatype,
+            on_disk=True,
+            hnsw_config=models.HnswConfigDiff(m=0),
+        )
+        return config
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts in one CLIP pass, L2-normalized"""
+        with profiling.stage("preprocess"):
+            inputs = self.text_encoder.encode(texts)
+        with profiling.stage("embed"), torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+
+        # Mean-pool over real tokens only, so padding in a batch doesn't change results
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        embeddings = ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).numpy()
+
+        projection = self.projection
+        if projection:
+            return projection.transform(embeddings)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
 
     def _load_initial_users(self):
         """Load initial users from JSON file and index them"""
@@ -54,42 +114,39 @@ class UserMatchingService:
         except Exception as e:
             print(f"Error loading initial users: {e}")
 
-    def _generate_user_embedding(self, user: User) -> np.ndarray:
-        """Generate embedding for a user profile using CLIP"""
-        # Combine relevant user information into a text description
-        user_text = f"{user.basic_info.profession} interested in {', '.join(user.interests)}. "
-        user_text += f"Values include {', '.join(user.values)}. "
-        user_text += f"Expert in {', '.join(user.expertise.areas)}. "
-        user_text += f"Prefers {user.preferences.collaboration_style} collaboration style."
-
-        # Generate embedding using CLIP
-        inputs = self.tokenizer(user_text, return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            embedding = self.model(**inputs).last_hidden_state.mean(dim=1)
+    @staticmethod
+    def _facet_texts(user: User) -> List[str]:
+        """One short description per facet, in FACETS order, each well within CLIP's 77 tokens"""
+        return [
+            f"{user.basic_info.profession} interested in {', '.join(user.interests)}. "
+            f"Enjoys {', '.join(user.activities)}.",
+            f"Values include {', '.join(user.values)}. "
+            f"Prefers {user.preferences.collaboration_style} collaboration style.",
+            f"{user.basic_info.profession} with {user.expertise.level} expertise in {', '.join(user.expertise.areas)}.",
+        ]
 
-        return embedding.numpy()[0]
+    def _generate_user_vectors(self, user: User) -> Dict[str, List[float]]:
+        """Generate the named facet vectors of a user profile in one batched CLIP pass"""
+        embeddings = self._embed_texts(self._facet_texts(user))
+        vectors = {facet: embedding.tolist() for facet, embedding in zip(FACETS, embeddings)}
+        vectors[FACETS_VECTOR] = embeddings.ravel().tolist()
+        return vectors
 
     def _generate_query_embedding(self, query: str) -> np.ndarray:
         """Generate embedding for a search query using CLIP"""
-        inputs = self.tokenizer(query, return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            embedding = self.model(**inputs).last_hidden_state.mean(dim=1)
-        return embedding.numpy()[0]
+        return self._embed_texts([query])[0]
+
+    def build_point(self, user: User) -> models.PointStruct:
+        """Embed a user profile into a Qdrant point"""
+        return models.PointStruct(
+            id=hash(user.id),  # Use hash of user ID as point ID
+            vector=self._generate_user_vectors(user),
+            payload=json.loads(user.model_dump_json()),
+        )
 
     def index_user(self, user: User):
         """Index a user profile in Qdrant"""
-        embedding = self._generate_user_embedding(user)
-
-        self.qdrant.upsert(
-            collection_name=self.collection_name,
-            points=[
-                models.PointStruct(
-                    id=hash(user.id),  # Use hash of user ID as point ID
-                    vector=embedding.tolist(),
-                    payload=json.loads(user.model_dump_json()),
-                )
-            ],
-        )
+        self.qdrant.upsert(collection_name=self.collection_name, points=[self.build_point(user)])
 
     def _calculate_match_reasons(self, query: str, user: User) -> List[str]:
         """Generate reasons for why a user matches the query"""
@@ -119,21 +176,155 @@ class UserMatchingService:
 
         return reasons or ["Profile aligns with search criteria"]
 
-    def find_matches(self, query: str, limit: int = 5) -> UserMatchResponse:
-        """Find matching users based on a natural language query"""
+    @staticmethod
+    def _facet_weights(weights: Optional[Dict[str, float]]) -> Dict[str, float]:
+        """
+        Validate per-facet weights and scale them to sum to 1, so scores stay in cosine
+        range. Facets that are left out get no weight.
+
+        Raises:
+            ValueError: On unknown facets, negative weights or all-zero weights
+        """
+        if weights is None:
+            return DEFAULT_FACET_WEIGHTS
+        unknown = set(weights) - set(FACETS)
+        if unknown:
+            raise ValueError(f"Unknown facets {sorted(unknown)}, expected some of {list(FACETS)}")
+        if any(weight < 0 for weight in weights.values()) or not any(weights.values()):
+            raise ValueError("Facet weights must be non-negative and not all zero")
+        total = sum(weights.values())
+        return {facet: weights.get(facet, 0.0) / total for facet in FACETS}
+
+    def _search(
+        self,
+        query_embedding: np.ndarray,
+        limit: int,
+        params: Optional[models.SearchParams] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> List[Any]:
+        """
+        Search the user collection with one query: each weighted facet prefetches
+        candidates from its own HNSW index, then Qdrant rescores them by the weighted
+        sum of facet similarities.
+
+        Args:
+            params: Search precision (HNSW beam, exact, quantization rescoring), or collection defaults
+        """
+        weights = self._facet_weights(weights)
+        prefetch = [
+            models.Prefetch(query=query_embedding.tolist(), using=facet, limit=limit * PREFETCH_FACTOR, params=params)
+            for facet in FACETS
+            if weights[facet] > 0
+        ]
+        weighted_query = np.concatenate([weights[facet] * query_embedding for facet in FACETS])
+
+        with profiling.stage("qdrant"):
+            return self.qdrant.query_points(
+                collection_name=self.collection_name,
+                prefetch=prefetch,
+                query=weighted_query.tolist(),
+                using=FACETS_VECTOR,
+                limit=limit,
+                search_params=params,
+                with_payload=True,
+            ).points
+
+    def _build_match(self, query: str, result: Any) -> UserMatch:
+        """Turn a scored Qdrant point into a UserMatch with explanations"""
+        user = User(**result.payload)
+        match_reasons = self._calculate_match_reasons(query, user)
+        return UserMatch(user=user, compatibility_score=float(result.score), match_reasons=match_reasons)
+
+    def find_matches(
+        self,
+        query: str,
+        limit: int = 5,
+        weights: Optional[Dict[str, float]] = None,
+        profile: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> UserMatchResponse:
+        """
+        Find matching users based on a natural language query.
+
+        Args:
+            query: Natural language description of the wanted users
+            limit: Maximum number of matches
+            weights: Relative weight per facet (interests, values, expertise)
+            profile: Search precision ("fast", "balanced", "exact" or "auto")
+            deadline: Monotonic deadline of the request, used by the "auto" profile
+
+        Raises:
+            ValueError: If the facet weights or the profile are invalid
+        """
+        weights = self._facet_weights(weights)
+        profile = resolve_profile(profile, deadline)
+
+        # Identical concurrent queries share one embedding and search
+        response = self._coalescer.do(
+            (normalize_text(query), limit, tuple(weights.items()), profile),
+            lambda: self._find_matches(normalize_text(query), limit, weights, profile),
+        )
+        return response.model_copy(update={"query_understanding": f"Looking for users matching: {query}"})
+
+    def _find_matches(
+        self, query: str, limit: int, weights: Dict[str, float], profile: Optional[str]
+    ) -> UserMatchResponse:
         # Generate query embedding
         query_embedding = self._generate_query_embedding(query)
 
         # Search in Qdrant
-        search_results = self.qdrant.search(
-            collection_name=self.collection_name, query_vector=query_embedding.tolist(), limit=limit
-        )
+        search_results = self._search(query_embedding, limit, search_params(profile), weights)
 
         # Process results
-        matches = []
-        for result in search_results:
-            user = User(**result.payload)
-            match_reasons = self._calculate_match_reasons(query, user)
-            matches.append(UserMatch(user=user, compatibility_score=float(result.score), match_reasons=match_reasons))
+        with profiling.stage("serialize"):
+            matches = [self._build_match(query, result) for result in search_results]
 
         return UserMatchResponse(matches=matches, query_understanding=f"Looking for users matching: {query}")
+
+    def stream_matches(
+        self, query: str, limit: int = 5, weights: Optional[Dict[str, float]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield match events progressively: fast low-ef hits first, then refined ones"""
+        weights = self._facet_weights(weights)
+        query_embedding = self._generate_query_embedding(query)
+
+        yield {"stage": "query", "query_understanding": f"Looking for users matching: {query}"}
+        yield from progressive_search_events(
+            search=lambda hnsw_ef: self._search(query_embedding, limit, models.SearchParams(hnsw_ef=hnsw_ef), weights),
+            render=lambda result: self._build_match(query, result).model_dump(mode="json"),
+        )
+
+    def get_mutual_matches(self, user_id: str, limit: int = 10) -> MutualMatchResponse:
+        """
+        Read precomputed reciprocal matches for a user (see backend.services.mutual_matching).
+
+        Raises:
+            KeyError: If no user with this id is indexed
+        """
+        records, _ = self.qdrant.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=models.Filter(must=[models.FieldCondition(key="id", match=models.MatchValue(value=user_id))]),
+            limit=1,
+            with_payload=[MUTUAL_MATCHES_FIELD],
+        )
+        if not records:
+            raise KeyError(user_id)
+
+        entries = (records[0].payload or {}).get(MUTUAL_MATCHES_FIELD, [])[:limit]
+        partners = {
+            point.id: point
+            for point in self.qdrant.retrieve(
+                collection_name=self.collection_name, ids=[entry["point_id"] for entry in entries]
+            )
+        }
+
+        matches = [
+            MutualMatch(
+                user=User(**partners[entry["point_id"]].payload),
+                mutual_score=entry["score"],
+                similarity=entry["similarity"],
+            )
+            for entry in entries
+            if entry["point_id"] in partners
+        ]
+        return MutualMatchResponse(user_id=user_id, matches=matches)
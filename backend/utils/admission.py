@@ -0,0 +1,202 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import Request
+
+# Priority lanes: lower runs first, so cheap text queries overtake image uploads
+LANE_INTERACTIVE = 0
+LANE_BULK = 1
+
+# Client-supplied time budget for a request, in milliseconds
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+MAX_DEADLINE_SECONDS = 60.0
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued or run"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Overloaded):
+    """Raised when a request's deadline passes while it is still queued"""
+
+
+class AdmissionQueue:
+    """
+    Bounded priority queue in front of a fixed number of concurrent slots.
+
+    Waiters are admitted by (lane, arrival order). Requests are rejected outright
+    when the queue is full, and dropped from the queue once their deadline passes,
+    so no work is started for a client that has already given up.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, retry_after: int = 1):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        self._active = 0
+        self._queued = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    async def acquire(self, lane: int, deadline: float):
+        """Wait for a slot until the monotonic deadline"""
+        self._loop = asyncio.get_running_loop()
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            self.stats["admitted"] += 1
+            return
+
+        if self._queued >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"{self.name} queue is full", self.retry_after)
+
+        waiter = self._loop.create_future()
+        heapq.heappush(self._waiters, (lane, next(self._sequence), waiter))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=max(deadline - time.monotonic(), 0))
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over, but this request gave up before it resumed: pass it on
+                self.release()
+            else:
+                self._queued -= 1
+            if isinstance(error, asyncio.TimeoutError):
+                self.stats["expired"] += 1
+                raise DeadlineExceeded(f"Deadline expired while queued for {self.name}", self.retry_after)
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self):
+        """Hand the slot to the next live waiter, or free it"""
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._queued -= 1
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def release_threadsafe(self):
+        """Release from any thread, e.g. a threadpool worker finishing a streamed response"""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if self._loop is not None and running_loop is not self._loop:
+            self._loop.call_soon_threadsafe(self.release)
+        else:
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"active": self._active, "queued": self._queued, **self.stats}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+# Shared pool bounding all in-flight CLIP/search work in this worker
+inference_queue = AdmissionQueue(
+    "inference",
+    max_concurrency=_env_int("INFERENCE_CONCURRENCY", os.cpu_count() or 4),
+    max_queue=_env_int("INFERENCE_MAX_QUEUE", 64),
+)
+
+# Per-endpoint limits: (max concurrency, max queue, default deadline in seconds)
+ENDPOINT_LIMITS = {
+    "users.match": (_env_int("USERS_MATCH_CONCURRENCY", 8), 32, 2.0),
+    "images.search": (_env_int("IMAGES_SEARCH_CONCURRENCY", 2), 16, 10.0),
+    "products.search": (_env_int("PRODUCTS_SEARCH_CONCURRENCY", 4), 32, 5.0),
+    "images.thumb": (_env_int("IMAGES_THUMB_CONCURRENCY", 8), 64, 10.0),
+}
+endpoint_queues = {
+    name: AdmissionQueue(name, max_concurrency, max_queue)
+    for name, (max_concurrency, max_queue, _) in ENDPOINT_LIMITS.items()
+}
+
+
+def request_deadline(request: Request, default_seconds: float) -> float:
+    """Monotonic deadline from the client's timeout header, or the endpoint default"""
+    budget = default_seconds
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            budget = min(max(float(header) / 1000, 0.0), MAX_DEADLINE_SECONDS)
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+
+class Ticket:
+    """Admission to both the endpoint and the shared inference queue; release is idempotent"""
+
+    def __init__(self, endpoint_queue: AdmissionQueue, deadline: float):
+        self.endpoint_queue = endpoint_queue
+        self.deadline = deadline
+        self._released = False
+
+    def remaining(self) -> float:
+        """Seconds left before the request's deadline"""
+        return self.deadline - time.monotonic()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        inference_queue.release_threadsafe()
+        self.endpoint_queue.release_threadsafe()
+
+
+async def acquire(request: Request, endpoint: str, lane: int) -> Ticket:
+    """
+    Admit a request through its endpoint queue and the shared inference queue.
+
+    The deadline is stored on request.state so downstream code can read it.
+
+    Raises:
+        Overloaded: If a queue is full or the deadline passes while waiting
+    """
+    endpoint_queue = endpoint_queues[endpoint]
+    deadline = request_deadline(request, ENDPOINT_LIMITS[endpoint][2])
+    request.state.deadline = deadline
+
+    await endpoint_queue.acquire(lane, deadline)
+    try:
+        await inference_queue.acquire(lane, deadline)
+    except BaseException:
+        endpoint_queue.release()
+        raise
+    return Ticket(endpoint_queue, deadline)
+
+
+@asynccontextmanager
+async def admit(request: Request, endpoint: str, lane: int) -> AsyncIterator[Ticket]:
+    """Hold an admission ticket for the duration of the block"""
+    ticket = await acquire(request, endpoint, lane)
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current occupancy and counters of all admission queues"""
+    return {
+        "inference": inference_queue.snapshot(),
+        "endpoints": {name: queue.snapshot() for name, queue in endpoint_queues.items()},
+    }
@@ -0,0 +1,41 @@
+from typing import Dict, Tuple, Union
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+VectorsConfig = Union[models.VectorParams, Dict[str, models.VectorParams]]
+
+
+def vector_schema(vectors_config: VectorsConfig) -> Dict[str, Tuple[int, models.Distance]]:
+    """Reduce a vectors config to {vector name: (size, distance)}, "" being the unnamed vector"""
+    if isinstance(vectors_config, models.VectorParams):
+        vectors_config = {"": vectors_config}
+    return {name: (params.size, params.distance) for name, params in vectors_config.items()}
+
+
+def ensure_collection(client: QdrantClient, collection_name: str, vectors_config: VectorsConfig, **kwargs):
+    """
+    Create a collection if it is missing, or check that the existing one matches.
+
+    Args:
+        client: Qdrant client to use
+        collection_name: Collection or alias name
+        vectors_config: Expected vector configuration
+        **kwargs: Extra create_collection arguments (quantization, HNSW, ...)
+
+    Raises:
+        ValueError: If the collection exists with a different vector schema
+    """
+    try:
+        info = client.get_collection(collection_name)
+    except Exception:
+        client.create_collection(collection_name=collection_name, vectors_config=vectors_config, **kwargs)
+        return
+
+    existing = vector_schema(info.config.params.vectors)
+    expected = vector_schema(vectors_config)
+    if existing != expected:
+        raise ValueError(
+            f"Collection '{collection_name}' has vector schema {existing}, expected {expected}. "
+            "Rebuild it with backend.services.reindex."
+        )
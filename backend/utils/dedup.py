@@ -0,0 +1,153 @@
+import hashlib
+import io
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """64-bit difference hash: compares horizontally adjacent pixels of a tiny grayscale thumbnail"""
+    # Let the JPEG decoder downscale while decoding; far cheaper than a full decode
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = gray.tobytes()
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for near-duplicate hash lookups"""
+
+    def __init__(self):
+        # Each node is [hash, item, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item: Any):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, item, {}]
+                return
+            node = child
+
+    def find(self, value: int, max_distance: int, exclude: Any = None) -> Optional[Tuple[int, Any]]:
+        """Return (distance, item) of the closest entry within max_distance, if any, ignoring exclude"""
+        best = None
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            excluded = exclude is not None and node[1] == exclude
+            if distance <= max_distance and not excluded and (best is None or distance < best[0]):
+                best = (distance, node[1])
+                if distance == 0:
+                    break
+            # Triangle inequality: only children within max_distance of this distance can match
+            for child_distance, child in node[2].items():
+                if abs(child_distance - distance) <= max_distance:
+                    stack.append(child)
+        return best
+
+
+class ImageDeduplicator:
+    """
+    Detects duplicate images before and after embedding, and accounts for the work saved.
+
+    Exact duplicates are caught by a SHA-256 of the file bytes and near duplicates by
+    a dHash lookup in a BK-tree, both before CLIP runs. Images that only look alike to
+    CLIP are caught at upsert time by an embedding-similarity threshold.
+    """
+
+    def __init__(self, max_hamming_distance: int = 6, embedding_threshold: float = 0.98):
+        self.max_hamming_distance = max_hamming_distance
+        self.embedding_threshold = embedding_threshold
+
+        self._lock = threading.Lock()
+        self._exact: Dict[str, Any] = {}
+        self._tree = BKTree()
+        self.stats = {
+            "seen": 0,
+            "indexed": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "embedding_duplicates": 0,
+            "clip_seconds": 0.0,
+            "clip_passes": 0,
+        }
+
+    @staticmethod
+    def fingerprint(data: bytes) -> Dict[str, str]:
+        """Content hash and perceptual hash of an encoded image"""
+        return {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "phash": f"{dhash(Image.open(io.BytesIO(data))):016x}",
+        }
+
+    def add(self, fingerprint: Dict[str, str], image_id: Any):
+        """Register an indexed image so later copies of it are skipped"""
+        with self._lock:
+            self._exact[fingerprint["sha256"]] = image_id
+            self._tree.add(int(fingerprint["phash"], 16), image_id)
+
+    def check(self, fingerprint: Dict[str, str], image_id: Any = None) -> Optional[Tuple[str, Any]]:
+        """
+        Look an image up before embedding it.
+
+        Args:
+            fingerprint: Hashes of the image
+            image_id: Id the image will be indexed under; matches of that id are
+                re-indexes of the same image, not duplicates
+
+        Returns:
+            ("exact" | "near", id of the image it duplicates), or None if it is new
+        """
+        with self._lock:
+            self.stats["seen"] += 1
+            original = self._exact.get(fingerprint["sha256"])
+            if original is not None and (image_id is None or original != image_id):
+                self.stats["exact_duplicates"] += 1
+                return "exact", original
+
+            near = self._tree.find(int(fingerprint["phash"], 16), self.max_hamming_distance, exclude=image_id)
+            if near is not None:
+                self.stats["near_duplicates"] += 1
+                return "near", near[1]
+        return None
+
+    def record_embedding(self, seconds: float, duplicate: bool = False):
+        """Account for one CLIP pass, and whether its result was dropped as a duplicate"""
+        with self._lock:
+            self.stats["clip_passes"] += 1
+            self.stats["clip_seconds"] += seconds
+            self.stats["embedding_duplicates" if duplicate else "indexed"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        """Summary of skipped vectors and the CLIP compute saved by skipping before embedding"""
+        with self._lock:
+            stats = dict(self.stats)
+        skipped_before_clip = stats["exact_duplicates"] + stats["near_duplicates"]
+        mean_clip_seconds = stats["clip_seconds"] / stats["clip_passes"] if stats["clip_passes"] else 0.0
+        return {
+            **stats,
+            "vectors_saved": skipped_before_clip + stats["embedding_duplicates"],
+            "clip_passes_saved": skipped_before_clip,
+            "clip_seconds_saved": round(skipped_before_clip * mean_clip_seconds, 3),
+        }
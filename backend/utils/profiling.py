@@ -0,0 +1,357 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import torch
+from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Where profiler and trace dumps are written
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "data/profiles"))
+# Admin endpoints and forced tracing are disabled unless a token is configured
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+TRACE_REQUEST_HEADER = "X-Trace-Request"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+PROFILER_KINDS = ("sampling", "torch")
+MAX_PROFILE_SECONDS = 300.0
+
+
+def is_admin(request: Request) -> bool:
+    """Whether a request carries the configured admin token"""
+    token = os.getenv("ADMIN_TOKEN")
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER)
+    return bool(token and supplied and secrets.compare_digest(token, supplied))
+
+
+class RequestTrace:
+    """Wall-clock spans of the stages of one request"""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.time()
+        self.duration: Optional[float] = None
+        self.spans: List[tuple] = []  # (stage, offset, duration, thread id)
+        self._origin = time.perf_counter()
+
+    def add(self, stage: str, start: float, end: float):
+        self.spans.append((stage, start - self._origin, end - start, threading.get_ident()))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._origin
+
+    def summary(self) -> Dict[str, Any]:
+        stages: Dict[str, float] = {}
+        for stage, _, duration, _ in self.spans:
+            stages[stage] = stages.get(stage, 0.0) + duration * 1000
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "stages_ms": {stage: round(ms, 3) for stage, ms in stages.items()},
+        }
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        """Complete ("X") events in Chrome trace format, one process per request"""
+        start_us = self.started * 1e6
+        events = [
+            {"name": "process_name", "ph": "M", "pid": self.id, "args": {"name": f"{self.name} {self.id}"}},
+            {"name": self.name, "ph": "X", "pid": self.id, "tid": 0, "ts": start_us, "dur": (self.duration or 0) * 1e6},
+        ]
+        for stage, offset, duration, thread_id in self.spans:
+            events.append(
+                {
+                    "name": stage,
+                    "ph": "X",
+                    "pid": self.id,
+                    "tid": thread_id,
+                    "ts": start_us + offset * 1e6,
+                    "dur": duration * 1e6,
+                }
+            )
+        return events
+
+
+class Tracer:
+    """Samples requests for stage tracing and keeps the most recent traces"""
+
+    def __init__(self, sample_rate: float = 0.0, max_traces: int = 500):
+        self.sample_rate = sample_rate
+        self.traces: "deque[RequestTrace]" = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def maybe_start(self, name: str, force: bool = False) -> Optional[RequestTrace]:
+        if force or (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return RequestTrace(name)
+        return None
+
+    def finish(self, trace: RequestTrace):
+        trace.finish()
+        with self._lock:
+            self.traces.append(trace)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [trace.summary() for trace in list(self.traces)[-limit:]]
+
+    def dump(self, directory: Path = PROFILE_DIR) -> Path:
+        """Write all kept traces as one Chrome trace file and clear them"""
+        with self._lock:
+            traces = list(self.traces)
+            self.traces.clear()
+        path = directory / f"traces-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        events = [event for trace in traces for event in trace.chrome_events()]
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        return path
+
+
+tracer = Tracer(sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")))
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread at a fixed interval from a background
+    thread and aggregates them as collapsed stacks (the input of flamegraph.pl,
+    speedscope and similar tools). Costs nothing while stopped.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, path: Path) -> Path:
+        self._stop.set()
+        self._thread.join()
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+        return path
+
+
+class ProfilerControl:
+    """
+    Runs at most one profiler session at a time, stopping it after its time window.
+
+    The torch profiler only records the thread that starts it, while inference runs
+    in threadpool workers. A torch session therefore profiles each outermost stage()
+    on the thread that runs it and merges these windows into one Chrome trace when
+    it stops. Kineto allows one profiler at a time, so profiled stages take turns.
+    """
+
+    def __init__(self, directory: Path = PROFILE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._torch_lock = threading.Lock()
+        self._session: Optional[Dict[str, Any]] = None
+        self.last_output: Optional[str] = None
+
+    @property
+    def torch_active(self) -> bool:
+        session = self._session
+        return session is not None and session["kind"] == "torch"
+
+    def start(self, kind: str, duration: float) -> Dict[str, Any]:
+        """
+        Start a profiler for at most duration seconds.
+
+        Raises:
+            ValueError: On an unknown profiler kind or duration
+            RuntimeError: If a session is already running
+        """
+        if kind not in PROFILER_KINDS:
+            raise ValueError(f"Unknown profiler '{kind}', expected one of {list(PROFILER_KINDS)}")
+        if not 0 < duration <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"Duration must be between 0 and {MAX_PROFILE_SECONDS} seconds")
+
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError(f"A {self._session['kind']} profiler is already running")
+            session = {"kind": kind, "started": time.time()}
+            if kind == "torch":
+                # Filled by profile_thread() from the threads that run the stages
+                session.update(events=[], metadata={})
+            else:
+                session["profiler"] = SamplingProfiler()
+                session["profiler"].start()
+
+            session["timer"] = threading.Timer(duration, self._expire)
+            session["timer"].daemon = True
+            self._session = session
+            session["timer"].start()
+            return self.status()
+
+    def _expire(self):
+        try:
+            self.stop()
+        except Exception:
+            logger.exception("Could not stop the profiler at the end of its window; stop it again from the admin API")
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop the running session (if any) and write its output file"""
+        with self._lock:
+            session = self._session
+            if session is None:
+                return self.status()
+            session["timer"].cancel()
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            if session["kind"] == "torch":
+                path = self.directory / f"torch-{stamp}.json"
+                path.write_text(json.dumps({**session["metadata"], "traceEvents": session["events"]}))
+            else:
+                path = session["profiler"].stop(self.directory / f"sampling-{stamp}.folded")
+            # Cleared only once the output is written, so a failed stop can be retried
+            self._session = None
+            self.last_output = str(path)
+            return self.status()
+
+    @contextmanager
+    def profile_thread(self) -> Iterator[None]:
+        """Record the block with the torch profiler on the calling thread and add it to the running session"""
+        session = self._session
+        with self._torch_lock:
+            profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+            _thread_state.profiling = True
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                _thread_state.profiling = False
+                self._collect(session, profiler)
+
+    def _collect(self, session: Optional[Dict[str, Any]], profiler: torch.profiler.profile):
+        """Append one profiled window to the session it was started in, unless that has ended"""
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "trace.json"
+                profiler.export_chrome_trace(str(path))
+                trace = json.loads(path.read_text())
+        except Exception:
+            logger.exception("Could not export a torch profiler window")
+            return
+        with self._lock:
+            if session is not None and self._session is session:
+                session["events"].extend(trace.pop("traceEvents", []))
+                session["metadata"] = session["metadata"] or trace
+
+    def status(self) -> Dict[str, Any]:
+        session = self._session
+        return {
+            "running": session["kind"] if session else None,
+            "started": session["started"] if session else None,
+            "last_output": self.last_output,
+        }
+
+
+profiler_control = ProfilerControl()
+# Whether the current thread is inside a torch-profiled stage
+_thread_state = threading.local()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a hot-path stage (decode, preprocess, embed, qdrant, serialize) for the
+    current request's trace, and record and label it in torch profiles. A no-op
+    unless the request is traced or the torch profiler is running. Stages on the
+    event loop are left out of torch profiles rather than wait for the profiler.
+    """
+    trace = _current_trace.get()
+    profile = profiler_control.torch_active and not _on_event_loop()
+    if trace is None and not profile:
+        yield
+        return
+
+    with ExitStack() as stack:
+        if profile:
+            if not getattr(_thread_state, "profiling", False):
+                stack.enter_context(profiler_control.profile_thread())
+            stack.enter_context(torch.profiler.record_function(name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace is not None:
+                trace.add(name, start, time.perf_counter())
+
+
+class TraceRequestsMiddleware:
+    """
+    ASGI middleware that traces sampled requests until their (possibly streamed) body
+    is sent. Requests that are not sampled go straight to the app.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        force = Headers(scope=scope).get(TRACE_REQUEST_HEADER) == "1" and is_admin(Request(scope))
+        trace = tracer.maybe_start(f"{scope['method']} {scope['path']}", force=force)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_trace_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(TRACE_ID_HEADER, trace.id)
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(token)
+            tracer.finish(trace)
@@ -0,0 +1,259 @@
+import hashlib
+import threading
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+PROJECTIONS_DIR = Path("data/projections")
+CLIP_EMBEDDING_SIZE = 512
+
+# Storage options for reduced vectors. "uint8" keeps float16 vectors on disk and an
+# int8 scalar-quantized copy in RAM; Qdrant rescores with the originals.
+STORAGE_DATATYPES = {
+    "float32": models.Datatype.FLOAT32,
+    "float16": models.Datatype.FLOAT16,
+    "uint8": models.Datatype.FLOAT16,
+}
+# Bytes per dimension held in RAM for search
+STORAGE_BYTES = {"float32": 4, "float16": 2, "uint8": 1}
+
+
+class EmbeddingProjection:
+    """PCA projection of CLIP embeddings to fewer dimensions, versioned per collection"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.version = hashlib.sha1(self.mean.tobytes() + self.components.tobytes()).hexdigest()[:12]
+
+    @property
+    def input_dims(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dims: int) -> "EmbeddingProjection":
+        """Fit a PCA projection on a sample of corpus vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dims > min(vectors.shape):
+            raise ValueError(f"Cannot fit {dims} dims from {vectors.shape[0]} vectors of size {vectors.shape[1]}")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dims])
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Project one vector or a batch, re-normalized for cosine distance"""
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def path_for(collection_name: str) -> Path:
+        return PROJECTIONS_DIR / f"{collection_name}.npz"
+
+    def save(self, collection_name: str) -> Path:
+        """Store the projection next to the concrete collection it was fitted for"""
+        path = self.path_for(collection_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components, version=self.version)
+        return path
+
+    @classmethod
+    def load(cls, collection_name: str) -> Optional["EmbeddingProjection"]:
+        path = cls.path_for(collection_name)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"])
+
+    @classmethod
+    def for_collection(cls, qdrant: QdrantClient, name: str) -> Optional["EmbeddingProjection"]:
+        """Load the projection of the collection an alias (or collection name) resolves to"""
+        return cls.load(resolve_alias(qdrant, name))
+
+
+def resolve_alias(qdrant: QdrantClient, name: str) -> str:
+    """Concrete collection an alias points to, or the name itself"""
+    try:
+        for alias in qdrant.get_aliases().aliases:
+            if alias.alias_name == name:
+                return alias.collection_name
+    except Exception:
+        pass  # Qdrant unreachable; fall back to the plain name
+    return name
+
+
+class ProjectionResolver:
+    """
+    Projection of whichever collection an alias currently points to.
+
+    The alias target is looked up again at most every refresh_seconds and
+    projections are cached per concrete collection, so running services follow a
+    reindex alias swap (including one that changes dimensions) without a restart.
+    """
+
+    def __init__(self, qdrant: QdrantClient, alias: str, refresh_seconds: float = 1.0):
+        self.qdrant = qdrant
+        self.alias = alias
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._collection: Optional[str] = None
+        self._checked_at = 0.0
+        self._projections: Dict[str, Optional[EmbeddingProjection]] = {}
+        self._pinned: Optional[Tuple[Optional[EmbeddingProjection]]] = None
+
+    def pin(self, projection: Optional[EmbeddingProjection]):
+        """Use a fixed projection (or none) regardless of the alias, e.g. while building a new collection"""
+        self._pinned = (projection,)
+
+    def collection(self) -> str:
+        """Concrete collection the alias points to"""
+        now = time.monotonic()
+        with self._lock:
+            if self._collection is not None and now - self._checked_at < self.refresh_seconds:
+                return self._collection
+        collection = resolve_alias(self.qdrant, self.alias)
+        with self._lock:
+            self._collection, self._checked_at = collection, now
+        return collection
+
+    def get(self) -> Optional[EmbeddingProjection]:
+        """Projection for queries and writes against the alias right now"""
+        if self._pinned is not None:
+            return self._pinned[0]
+        collection = self.collection()
+        with self._lock:
+            if collection in self._projections:
+                return self._projections[collection]
+        projection = EmbeddingProjection.load(collection)
+        with self._lock:
+            self._projections[collection] = projection
+        return projection
+
+
+def storage_config(dims: int, storage: str = "float32") -> Tuple[models.VectorParams, Dict[str, Any]]:
+    """
+    Vector params and extra create_collection arguments for a storage option.
+
+    Returns:
+        (vectors_config, collection kwargs)
+    """
+    vectors_config = models.VectorParams(
+        size=dims, distance=models.Distance.COSINE, datatype=STORAGE_DATATYPES[storage]
+    )
+    kwargs = {}
+    if storage == "uint8":
+        kwargs["quantization_config"] = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+        )
+    return vectors_config, kwargs
+
+
+def _quantize_uint8(vectors: np.ndarray) -> np.ndarray:
+    """Simulate per-dimension min/max uint8 quantization"""
+    low, high = vectors.min(axis=0), vectors.max(axis=0)
+    scale = np.maximum(high - low, 1e-12) / 255.0
+    return np.round((vectors - low) / scale) * scale + low
+
+
+def recall_report(
+    vectors: np.ndarray,
+    projection: Optional[EmbeddingProjection],
+    storage: str = "float32",
+    k: int = 10,
+    sample_size: int = 200,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Brute-force recall@k of reduced vectors against the full-precision originals.
+
+    Args:
+        vectors: Full-dimension corpus sample
+        projection: Projection to evaluate, or None for storage-only changes
+        storage: Storage option, used to simulate float16/uint8 rounding
+        k: Neighbours compared per query
+        sample_size: Number of corpus vectors used as queries
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    full = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    reduced = projection.transform(vectors) if projection else full
+    if storage == "float16":
+        reduced = reduced.astype(np.float16).astype(np.float32)
+    elif storage == "uint8":
+        reduced = _quantize_uint8(reduced)
+
+    n = len(vectors)
+    k = min(k, n - 1)
+    queries = np.random.default_rng(seed).choice(n, size=min(sample_size, n), replace=False)
+    recalls = []
+    for q in queries:
+        exact = np.argsort(-(full @ full[q]))
+        approx = np.argsort(-(reduced @ reduced[q]))
+        exact_ids = set(exact[exact != q][:k].tolist())
+        approx_ids = set(approx[approx != q][:k].tolist())
+        recalls.append(len(exact_ids & approx_ids) / max(len(exact_ids), 1))
+
+    dims = projection.dims if projection else vectors.shape[1]
+    bytes_per_vector = dims * STORAGE_BYTES[storage]
+    return {
+        "dims": dims,
+        "storage": storage,
+        "version": projection.version if projection else None,
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "bytes_per_vector": bytes_per_vector,
+        "compression": round(vectors.shape[1] * 4 / bytes_per_vector, 2),
+    }
+
+
+def project_points(
+    points: Iterable[models.PointStruct], dims: Optional[int], fit_sample: int = 5000
+) -> Tuple[Iterator[models.PointStruct], Optional[EmbeddingProjection], np.ndarray]:
+    """
+    Fit a projection on the first fit_sample points of a stream and project the whole stream.
+
+    Points may carry named vectors; every embedding in them is projected.
+
+    Returns:
+        (projected point stream, fitted projection or None, full-dimension fit sample)
+    """
+    points = iter(points)
+    head: List[models.PointStruct] = []
+    for point in points:
+        head.append(point)
+        if len(head) == fit_sample:
+            break
+
+    sample = np.asarray([vector for point in head for vector in _embeddings(point.vector)], dtype=np.float32)
+    projection = EmbeddingProjection.fit(sample, dims) if dims else None
+
+    def stream() -> Iterator[models.PointStruct]:
+        for point in chain(head, points):
+            if projection:
+                if isinstance(point.vector, dict):
+                    point.vector = {name: _project(projection, vector) for name, vector in point.vector.items()}
+                else:
+                    point.vector = _project(projection, point.vector)
+            yield point
+
+    return stream(), projection, sample
+
+
+def _embeddings(vector: Any) -> List[List[float]]:
+    """The plain CLIP embeddings of a point; concatenated named vectors are left out of the fit"""
+    vectors = vector.values() if isinstance(vector, dict) else [vector]
+    return [vector for vector in vectors if len(vector) == CLIP_EMBEDDING_SIZE]
+
+
+def _project(projection: EmbeddingProjection, vector: List[float]) -> List[float]:
+    """Project a vector made of one or more concatenated embeddings, block by block"""
+    blocks = np.asarray(vector, dtype=np.float32).reshape(-1, projection.input_dims)
+    return projection.transform(blocks).ravel().tolist()
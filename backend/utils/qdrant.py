@@ -0,0 +1,171 @@
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Optional
+
+import httpx
+from pydantic import BaseModel
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+logger = logging.getLogger(__name__)
+
+# Calls that are safe to repeat after a transient failure
+RETRIED_METHODS = {
+    "batch_update_points",
+    "count",
+    "get_aliases",
+    "get_collection",
+    "get_collections",
+    "query_batch_points",
+    "query_points",
+    "query_points_groups",
+    "recommend",
+    "retrieve",
+    "scroll",
+    "search",
+    "search_batch",
+    "set_payload",
+    "upsert",
+}
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+TRANSIENT_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED"}
+
+
+class QdrantSettings(BaseModel):
+    """Connection settings for Qdrant, read from QDRANT_* environment variables"""
+
+    # ":memory:" or a directory runs Qdrant embedded in-process (tests, small deployments)
+    location: Optional[str] = None
+    url: Optional[str] = None
+    host: str = "localhost"
+    port: int = 6333
+    grpc_port: int = 6334
+    prefer_grpc: bool = True
+    api_key: Optional[str] = None
+    timeout: int = 10
+    pool_size: int = 32
+    retries: int = 3
+    backoff: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "QdrantSettings":
+        values = {}
+        for name in cls.model_fields:
+            value = os.getenv(f"QDRANT_{name.upper()}")
+            if value is not None:
+                values[name] = value
+        return cls(**values)
+
+
+class RetryingQdrantClient:
+    """Proxy that retries idempotent client calls on transient errors with jittered exponential backoff"""
+
+    def __init__(self, client: QdrantClient, retries: int, backoff: float):
+        self._client = client
+        self._retries = retries
+        self._backoff = backoff
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, ResponseHandlingException):
+            return True  # Connection-level failure
+        if isinstance(error, UnexpectedResponse):
+            return error.status_code in TRANSIENT_STATUS_CODES
+        code = getattr(error, "code", None)
+        return callable(code) and getattr(code(), "name", None) in TRANSIENT_GRPC_CODES
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name not in RETRIED_METHODS or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            for attempt in range(self._retries + 1):
+                try:
+                    return attr(*args, **kwargs)
+                except Exception as e:
+                    if attempt == self._retries or not self._is_transient(e):
+                        raise
+                    delay = self._backoff * 2**attempt * random.uniform(0.5, 1.0)
+                    logger.warning(f"Qdrant {name} failed ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+
+        return call
+
+
+class LockedQdrantClient:
+    """Proxy that serializes calls into an embedded client, which is not thread-safe"""
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+
+        return call
+
+
+def is_embedded(client: Any) -> bool:
+    """Whether a client (or any shard of a sharded one) runs Qdrant in-process"""
+    shards = getattr(client, "shards", None)
+    if isinstance(shards, list):
+        return any(is_embedded(shard) for shard in shards)
+    while isinstance(client, (RetryingQdrantClient, LockedQdrantClient)):
+        client = client._client
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+
+def create_qdrant_client(settings: Optional[QdrantSettings] = None) -> QdrantClient:
+    """Build a Qdrant client from settings (defaults to the environment)"""
+    settings = settings or QdrantSettings.from_env()
+
+    if settings.location:
+        if settings.location == ":memory:":
+            client = QdrantClient(location=":memory:")
+        else:
+            client = QdrantClient(path=settings.location, force_disable_check_same_thread=True)
+        # Shared by the API threadpool, shard fan-out and bulk loads
+        client = LockedQdrantClient(client)
+    else:
+        client = QdrantClient(
+            url=settings.url,
+            host=None if settings.url else settings.host,
+            port=settings.port,
+            grpc_port=settings.grpc_port,
+            prefer_grpc=settings.prefer_grpc,
+            api_key=settings.api_key,
+            timeout=settings.timeout,
+            # Keep-alive pool for the REST transport; gRPC multiplexes one channel
+            limits=httpx.Limits(max_connections=settings.pool_size, max_keepalive_connections=settings.pool_size),
+        )
+
+    if settings.retries > 0:
+        return RetryingQdrantClient(client, settings.retries, settings.backoff)
+    return client
+
+
+_shared_client: Optional[QdrantClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Process-wide Qdrant client shared by all routes and services"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = create_qdrant_client()
+        return _shared_client
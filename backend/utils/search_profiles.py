@@ -0,0 +1,43 @@
+import time
+from typing import Literal, Optional
+
+from qdrant_client.http import models
+
+# Latency/recall trade-offs a caller can ask for; "auto" picks one from the remaining deadline
+SearchProfile = Literal["fast", "balanced", "exact", "auto"]
+
+SEARCH_PROFILES = {
+    # Narrow HNSW beam over quantized vectors only, for typeahead-style queries
+    "fast": models.SearchParams(hnsw_ef=32, quantization=models.QuantizationSearchParams(rescore=False)),
+    # Wider beam, rescoring oversampled quantized candidates with the original vectors
+    "balanced": models.SearchParams(
+        hnsw_ef=128, quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+    ),
+    # Brute force over the original vectors, for batch jobs and recall checks
+    "exact": models.SearchParams(exact=True, quantization=models.QuantizationSearchParams(ignore=True)),
+}
+
+# Auto mode uses "balanced" while at least this much of the deadline is left, "fast" after that
+AUTO_BALANCED_MIN_SECONDS = 0.5
+
+
+def resolve_profile(profile: Optional[str], deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Concrete profile for a request; "auto" degrades to "fast" as the monotonic deadline nears.
+
+    Raises:
+        ValueError: On an unknown profile name
+    """
+    if profile is None or profile in SEARCH_PROFILES:
+        return profile
+    if profile != "auto":
+        raise ValueError(f"Unknown search profile '{profile}', expected one of {[*SEARCH_PROFILES, 'auto']}")
+    if deadline is None or deadline - time.monotonic() >= AUTO_BALANCED_MIN_SECONDS:
+        return "balanced"
+    return "fast"
+
+
+def search_params(profile: Optional[str], deadline: Optional[float] = None) -> Optional[models.SearchParams]:
+    """Qdrant search params of a profile, or None for the collection defaults"""
+    resolved = resolve_profile(profile, deadline)
+    return SEARCH_PROFILES[resolved] if resolved else None
@@ -0,0 +1,483 @@
+import hashlib
+import heapq
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils.qdrant import QdrantSettings, create_qdrant_client, get_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+PointId = Union[int, str]
+
+# Namespace of the deterministic UUIDs derived from image ids
+POINT_ID_NAMESPACE = uuid.UUID("5b8f6b1e-3c1a-4f0e-9d2a-7f4e1c0b9a62")
+
+# Alias of the image collection, the only sharded one
+IMAGES_COLLECTION = "midjourney-images"
+
+# Distances where a lower score is the better match
+ASCENDING_DISTANCES = {models.Distance.EUCLID, models.Distance.MANHATTAN}
+
+
+def stable_point_id(key: str) -> str:
+    """
+    Point id derived from an application id.
+
+    Unlike hash(), the result is the same in every process, so any worker can
+    retrieve a point and route it to the same shard.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, key))
+
+
+def shard_index(point_id: PointId, shard_count: int) -> int:
+    """Shard that owns a point id"""
+    digest = hashlib.sha256(str(point_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+class ShardHealth:
+    """
+    Health of one shard: latency and failure counters plus a circuit breaker.
+
+    After max_failures consecutive failures the shard is skipped by searches for
+    cooldown seconds, then tried again.
+    """
+
+    def __init__(self, name: str, max_failures: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._last_error: Optional[str] = None
+        self._latency_ms: Optional[float] = None
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "skipped": 0}
+
+    def available(self) -> bool:
+        with self._lock:
+            if time.monotonic() >= self._open_until:
+                return True
+            self.stats["skipped"] += 1
+            return False
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._consecutive_failures = 0
+            latency_ms = seconds * 1000
+            # Exponential moving average, so one slow call does not dominate
+            self._latency_ms = latency_ms if self._latency_ms is None else 0.8 * self._latency_ms + 0.2 * latency_ms
+
+    def record_failure(self, error: str, timeout: bool = False):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += 1
+            if timeout:
+                self.stats["timeouts"] += 1
+            self._consecutive_failures += 1
+            self._last_error = error
+            if self._consecutive_failures >= self.max_failures:
+                self._open_until = time.monotonic() + self.cooldown
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "healthy": time.monotonic() >= self._open_until,
+                "consecutive_failures": self._consecutive_failures,
+                "latency_ms": round(self._latency_ms, 3) if self._latency_ms is not None else None,
+                "last_error": self._last_error,
+                **self.stats,
+            }
+
+
+class ShardedQdrantClient:
+    """
+    Spreads a collection over several independent Qdrant instances.
+
+    Points are assigned to a shard by a hash of their id. Writes and lookups go
+    to the owning shard. Searches fan out to every healthy shard in parallel and
+    the per-shard top-k lists are merged with a heap. Shards that fail or miss
+    the timeout are left out of that result and counted in their health.
+
+    Implements the subset of the QdrantClient API used by the image service,
+    ingestion, reindexing, recommendation sessions, snapshots and benchmarks.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[QdrantClient],
+        names: Optional[Sequence[str]] = None,
+        timeout: float = 2.0,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+    ):
+        if not clients:
+            raise ValueError("At least one shard is required")
+        self.shards = list(clients)
+        self.names = list(names) if names else [f"shard-{i}" for i in range(len(clients))]
+        self.timeout = timeout
+        self.health = [ShardHealth(name, max_failures, cooldown) for name in self.names]
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.shards), thread_name_prefix="qdrant-shard")
+        self._ascending: Dict[str, bool] = {}
+
+    # Routing
+
+    def shard_for(self, point_id: PointId) -> int:
+        """Index of the shard that owns a point"""
+        return shard_index(point_id, len(self.shards))
+
+    def _group_ids(self, ids: Sequence[PointId]) -> Dict[int, List[PointId]]:
+        groups = defaultdict(list)
+        for point_id in ids:
+            groups[self.shard_for(point_id)].append(point_id)
+        return groups
+
+    def _timed(self, index: int, call: Callable[[QdrantClient], Any]) -> Any:
+        started = time.monotonic()
+        try:
+            result = call(self.shards[index])
+        except Exception as e:
+            self.health[index].record_failure(str(e))
+            raise
+        self.health[index].record_success(time.monotonic() - started)
+        return result
+
+    def _run(self, calls: Dict[int, Callable[[QdrantClient], Any]]) -> Dict[int, Any]:
+        """Run calls on their shards in parallel; any failure is raised (used for writes)"""
+        futures = {index: self._executor.submit(self._timed, index, call) for index, call in calls.items()}
+        return {index: future.result() for index, future in futures.items()}
+
+    def _fan_out(self, call: Callable[[QdrantClient], Any]) -> List[Any]:
+        """
+        Run a read on every healthy shard in parallel, returning the results that arrive in time.
+
+        Raises:
+            RuntimeError: If no shard answered
+        """
+        indexes = [index for index in range(len(self.shards)) if self.health[index].available()]
+        futures = {self._executor.submit(self._timed, index, call): index for index in indexes}
+        done, not_done = wait(futures, timeout=self.timeout)
+
+        results, errors = [], []
+        for future in done:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(f"{self.names[futures[future]]}: {e}")
+        for future in not_done:
+            index = futures[future]
+            self.health[index].record_failure(f"Timed out after {self.timeout}s", timeout=True)
+            errors.append(f"{self.names[index]}: timed out")
+
+        if errors:
+            logger.warning(f"Partial results, shards failed: {errors}")
+        if not results:
+            raise RuntimeError(f"No Qdrant shard answered: {errors or 'all shards unhealthy'}")
+        return results
+
+    def _broadcast(self, call: Callable[[QdrantClient], Any]) -> List[Any]:
+        """Run a schema operation on every shard"""
+        results = self._run({index: call for index in range(len(self.shards))})
+        return [results[index] for index in range(len(self.shards))]
+
+    # Merging
+
+    def _is_ascending(self, collection_name: str, using: Optional[str] = None) -> bool:
+        key = f"{collection_name}/{using or ''}"
+        if key not in self._ascending:
+            vectors = self.shards[0].get_collection(collection_name).config.params.vectors
+            params = vectors[using] if isinstance(vectors, dict) else vectors
+            self._ascending[key] = params.distance in ASCENDING_DISTANCES
+        return self._ascending[key]
+
+    def _merge(
+        self, collection_name: str, per_shard: List[List[models.ScoredPoint]], limit: int, offset: int, using=None
+    ) -> List[models.ScoredPoint]:
+        """Global top-k from per-shard top-k lists"""
+        points = [point for points in per_shard for point in points]
+        if self._is_ascending(collection_name, using):
+            best = heapq.nsmallest(offset + limit, points, key=lambda point: point.score)
+        else:
+            best = heapq.nlargest(offset + limit, points, key=lambda point: point.score)
+        return best[offset:]
+
+    # Searches
+
+    def search(
+        self, collection_name: str, query_vector, limit: int = 10, offset: Optional[int] = None, **kwargs
+    ) -> List[models.ScoredPoint]:
+        """Search every shard for its top offset+limit and merge them"""
+        offset = offset or 0
+        per_shard = self._fan_out(
+            lambda client: client.search(
+                collection_name=collection_name, query_vector=query_vector, limit=offset + limit, **kwargs
+            )
+        )
+        using = query_vector[0] if isinstance(query_vector, tuple) else None
+        return self._merge(collection_name, per_shard, limit, offset, using)
+
+    def query_points(
+        self, collection_name: str, query=None, limit: int = 10, offset: Optional[int] = None, **kwargs
+    ) -> models.QueryResponse:
+        """Nearest-neighbour or recommend query over every shard"""
+        offset = offset or 0
+        using = kwargs.get("using")
+        query, example_ids = self._resolve_examples(collection_name, query, using)
+        if example_ids:
+            # Qdrant leaves id examples out of recommendations; vector examples need an explicit filter
+            query_filter = kwargs.get("query_filter") or models.Filter()
+            kwargs["query_filter"] = query_filter.model_copy(
+                update={"must_not": [*(query_filter.must_not or []), models.HasIdCondition(has_id=example_ids)]}
+            )
+        per_shard = self._fan_out(
+            lambda client: (
+                client.query_points(collection_name=collection_name, query=query, limit=offset + limit, **kwargs).points
+            )
+        )
+        return models.QueryResponse(points=self._merge(collection_name, per_shard, limit, offset, using))
+
+    def _resolve_examples(
+        self, collection_name: str, query: Any, using: Optional[str] = None
+    ) -> Tuple[Any, List[PointId]]:
+        """
+        Replace point ids in a recommend query by their vectors, since each id exists on one shard only.
+
+        Returns:
+            (query, ids that were replaced)
+        """
+        if not isinstance(query, models.RecommendQuery):
+            return query, []
+
+        recommend = query.recommend
+        examples = [*(recommend.positive or []), *(recommend.negative or [])]
+        ids = [example for example in examples if isinstance(example, (int, str))]
+        if not ids:
+            return query, []
+
+        records = self.retrieve(collection_name, ids, with_vectors=[using] if using else True)
+        vectors = {str(record.id): record.vector[using] if using else record.vector for record in records}
+        missing = [point_id for point_id in ids if str(point_id) not in vectors]
+        if missing:
+            raise ValueError(f"Points not found: {missing}")
+
+        def resolve(examples):
+            return [vectors[str(example)] if isinstance(example, (int, str)) else example for example in examples or []]
+
+        resolved = recommend.model_copy(
+            update={"positive": resolve(recommend.positive), "negative": resolve(recommend.negative)}
+        )
+        return models.RecommendQuery(recommend=resolved), ids
+
+    def count(self, collection_name: str, **kwargs) -> models.CountResult:
+        results = self._broadcast(lambda client: client.count(collection_name, **kwargs))
+        return models.CountResult(count=sum(result.count for result in results))
+
+    def scroll(
+        self, collection_name: str, limit: int = 10, offset: Optional[Tuple[int, Any]] = None, **kwargs
+    ) -> Tuple[List[models.Record], Optional[Tuple[int, Any]]]:
+        """
+        Page through one shard after another.
+
+        The offset is a (shard index, shard offset) pair; pass back the returned one.
+        """
+        index, shard_offset = offset or (0, None)
+        records, next_offset = self._timed(
+            index,
+            lambda client: client.scroll(collection_name=collection_name, limit=limit, offset=shard_offset, **kwargs),
+        )
+        if next_offset is not None:
+            return records, (index, next_offset)
+        if index + 1 < len(self.shards):
+            return records, (index + 1, None)
+        return records, None
+
+    def retrieve(self, collection_name: str, ids: Sequence[PointId], **kwargs) -> List[models.Record]:
+        """Fetch points from their owning shards, in the order of ids"""
+        results = self._run(
+            {
+                index: (lambda client, group=group: client.retrieve(collection_name, ids=group, **kwargs))
+                for index, group in self._group_ids(ids).items()
+            }
+        )
+        by_id = {str(record.id): record for records in results.values() for record in records}
+        return [by_id[str(point_id)] for point_id in ids if str(point_id) in by_id]
+
+    # Writes
+
+    def upsert(self, collection_name: str, points: Union[models.Batch, List[models.PointStruct]], **kwargs):
+        """Write each point to its owning shard"""
+        if isinstance(points, models.Batch):
+            groups = defaultdict(list)
+            for position, point_id in enumerate(points.ids):
+                groups[self.shard_for(point_id)].append(position)
+
+            def select(values, positions):
+                if values is None:
+                    return None
+                if isinstance(values, dict):
+                    return {name: [vectors[p] for p in positions] for name, vectors in values.items()}
+                return [values[p] for p in positions]
+
+            batches = {
+                index: models.Batch(
+                    ids=select(points.ids, positions),
+                    vectors=select(points.vectors, positions),
+                    payloads=select(points.payloads, positions),
+                )
+                for index, positions in groups.items()
+            }
+        else:
+            batches = defaultdict(list)
+            for point in points:
+                batches[self.shard_for(point.id)].append(point)
+
+        self._run(
+            {
+                index: (lambda client, batch=batch: client.upsert(collection_name, points=batch, **kwargs))
+                for index, batch in batches.items()
+            }
+        )
+
+    def upload_collection(self, collection_name: str, vectors, payload=None, ids=None, **kwargs):
+        """Bulk upload with explicit ids, split by owning shard"""
+        if ids is None:
+            raise ValueError("Sharded uploads need explicit point ids")
+        groups = defaultdict(list)
+        for position, point_id in enumerate(ids):
+            groups[self.shard_for(point_id)].append(position)
+
+        def upload(client: QdrantClient, positions: List[int]):
+            if isinstance(vectors, dict):
+                shard_vectors = {name: matrix[positions] for name, matrix in vectors.items()}
+            else:
+                shard_vectors = vectors[positions]
+            client.upload_collection(
+                collection_name=collection_name,
+                vectors=shard_vectors,
+                payload=[payload[p] for p in positions] if payload is not None else None,
+                ids=[ids[p] for p in positions],
+                **kwargs,
+            )
+
+        self._run(
+            {
+                index: (lambda client, positions=positions: upload(client, positions))
+                for index, positions in groups.items()
+            }
+        )
+
+    def batch_update_points(self, collection_name: str, update_operations: List[Any], **kwargs):
+        """Apply payload updates addressed by point ids on the owning shards"""
+        per_shard = defaultdict(list)
+        for operation in update_operations:
+            if not isinstance(operation, models.SetPayloadOperation) or operation.set_payload.points is None:
+                raise ValueError("Sharded batch updates support set-payload operations by point ids only")
+            for index, group in self._group_ids(operation.set_payload.points).items():
+                per_shard[index].append(
+                    models.SetPayloadOperation(set_payload=operation.set_payload.model_copy(update={"points": group}))
+                )
+
+        self._run(
+            {
+                index: (
+                    lambda client, operations=operations: client.batch_update_points(
+                        collection_name=collection_name, update_operations=operations, **kwargs
+                    )
+                )
+                for index, operations in per_shard.items()
+            }
+        )
+
+    # Collection schema, applied to every shard
+
+    def get_collection(self, collection_name: str) -> models.CollectionInfo:
+        """First shard's collection info, with the total point count and the least ready status"""
+        infos = self._broadcast(lambda client: client.get_collection(collection_name))
+        statuses = [info.status for info in infos]
+        status = next((s for s in statuses if s != models.CollectionStatus.GREEN), models.CollectionStatus.GREEN)
+        return infos[0].model_copy(
+            update={"status": status, "points_count": sum(info.points_count or 0 for info in infos)}
+        )
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return all(self._broadcast(lambda client: client.collection_exists(collection_name)))
+
+    def create_collection(self, collection_name: str, **kwargs):
+        self._ascending.clear()
+        self._broadcast(lambda client: client.create_collection(collection_name=collection_name, **kwargs))
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs):
+        self._broadcast(lambda client: client.delete_collection(collection_name, **kwargs))
+        return True
+
+    def create_payload_index(self, collection_name: str, **kwargs):
+        self._broadcast(lambda client: client.create_payload_index(collection_name, **kwargs))
+
+    def update_collection_aliases(self, **kwargs):
+        self._ascending.clear()
+        self._broadcast(lambda client: client.update_collection_aliases(**kwargs))
+        return True
+
+    def get_aliases(self, **kwargs):
+        return self.shards[0].get_aliases(**kwargs)
+
+    def get_collections(self):
+        return self.shards[0].get_collections()
+
+    def __getattr__(self, name: str) -> Any:
+        raise AttributeError(f"{name} is not supported on a sharded Qdrant client")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Health of every shard"""
+        return {name: health.snapshot() for name, health in zip(self.names, self.health)}
+
+
+def _shard_settings(entry: str, base: QdrantSettings) -> QdrantSettings:
+    """Settings of one QDRANT_SHARDS entry: a URL, or ":memory:"/a directory for an embedded shard"""
+    if entry.startswith(("http://", "https://")):
+        return base.model_copy(update={"url": entry, "location": None})
+    return base.model_copy(update={"location": entry, "url": None})
+
+
+def create_sharded_client(entries: Sequence[str], timeout: Optional[float] = None) -> ShardedQdrantClient:
+    """Sharded client over one Qdrant instance per entry, with the other QDRANT_* settings shared"""
+    base = QdrantSettings.from_env()
+    clients = [create_qdrant_client(_shard_settings(entry, base)) for entry in entries]
+    timeout = timeout if timeout is not None else float(os.getenv("QDRANT_SHARD_TIMEOUT", 2.0))
+    return ShardedQdrantClient(clients, names=list(entries), timeout=timeout)
+
+
+_images_client = None
+_images_client_lock = threading.Lock()
+
+
+def get_images_qdrant_client():
+    """
+    Client for the image collection: sharded across the comma-separated QDRANT_SHARDS
+    instances when set, otherwise the shared client.
+    """
+    global _images_client
+    with _images_client_lock:
+        if _images_client is None:
+            entries = [entry.strip() for entry in os.getenv("QDRANT_SHARDS", "").split(",") if entry.strip()]
+            _images_client = create_sharded_client(entries) if entries else get_qdrant_client()
+        return _images_client
+
+
+def client_for_collection(collection_name: str):
+    """Client that holds a collection: the image client for the image alias and its versions, else the shared one"""
+    if collection_name == IMAGES_COLLECTION or collection_name.startswith(f"{IMAGES_COLLECTION}_v"):
+        return get_images_qdrant_client()
+    return get_qdrant_client()
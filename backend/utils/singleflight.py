@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from PIL import Image
+
+# All coalescing groups by name, for metrics
+_groups: Dict[str, "SingleFlight"] = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the
+    computation and every caller that arrives while it is in flight shares its
+    result (or exception). Nothing is cached once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+        _groups[name] = self
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._calls), **self.stats}
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a text query, matching what CLIP's tokenizer sees"""
+    return " ".join(text.lower().split())
+
+
+def image_digest(image: Image.Image) -> str:
+    """Content hash of a decoded image"""
+    digest = hashlib.sha256(f"{image.mode}|{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def snapshot() -> Dict[str, Any]:
+    """Coalescing counters of every group"""
+    return {name: group.snapshot() for name, group in _groups.items()}
@@ -0,0 +1,108 @@
+import json
+import weakref
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from backend.utils import profiling
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# HNSW beam widths for the two streaming passes
+FAST_HNSW_EF = 16
+REFINED_HNSW_EF = 128
+
+
+def encode_ndjson(event: Dict[str, Any]) -> str:
+    """Encode a single event as one NDJSON line"""
+    return json.dumps(event) + "\n"
+
+
+def encode_sse(event: Dict[str, Any]) -> str:
+    """Encode a single event as a Server-Sent-Events message"""
+    return f"event: {event.get('stage', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that runs a callback exactly once when it is done with.
+
+    The callback runs when the response finishes, fails or is cancelled by a client
+    disconnect, even if the body iterator was never started, and as a last resort
+    when an unsent response is garbage collected.
+    """
+
+    def __init__(self, *args, on_close: Callable[[], None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_close = weakref.finalize(self, on_close)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+
+def stream_events(
+    request: Request, events: Iterable[Dict[str, Any]], on_close: Optional[Callable[[], None]] = None
+) -> StreamingResponse:
+    """
+    Stream events as NDJSON, or as SSE when the client asks for text/event-stream.
+
+    Args:
+        request: Incoming request, used to negotiate the wire format
+        events: Iterable of JSON-serializable event dicts
+        on_close: Called once the response is finished or abandoned, e.g. to release an admission ticket
+    """
+    use_sse = SSE_MEDIA_TYPE in request.headers.get("accept", "")
+    encode = encode_sse if use_sse else encode_ndjson
+
+    def body() -> Iterator[str]:
+        try:
+            for event in events:
+                with profiling.stage("serialize"):
+                    chunk = encode(event)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield encode({"stage": "error", "detail": str(e)})
+
+    media_type = SSE_MEDIA_TYPE if use_sse else NDJSON_MEDIA_TYPE
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if on_close is None:
+        return StreamingResponse(body(), media_type=media_type, headers=headers)
+    return ClosingStreamingResponse(body(), media_type=media_type, headers=headers, on_close=on_close)
+
+
+def progressive_search_events(
+    search: Callable[[int], List[Any]],
+    render: Callable[[Any], Dict[str, Any]],
+    key: Callable[[Any], Hashable] = lambda hit: hit.id,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run a fast low-ef search followed by a refined one, yielding ranked events.
+
+    Fast hits are emitted one by one as they are rendered. The refined pass only
+    emits ranks whose hit changed, so clients can update slots in place. A final
+    "done" event carries the authoritative result count.
+
+    Args:
+        search: Callable taking an hnsw_ef value and returning scored hits
+        render: Converts a hit into a JSON-serializable result dict
+        key: Identity of a hit, used to skip unchanged ranks
+    """
+    fast_hits = search(FAST_HNSW_EF)
+    for rank, hit in enumerate(fast_hits):
+        yield {"stage": "fast", "rank": rank, "result": render(hit)}
+
+    fast_keys = [key(hit) for hit in fast_hits]
+    refined_hits = search(REFINED_HNSW_EF)
+    for rank, hit in enumerate(refined_hits):
+        if rank < len(fast_keys) and fast_keys[rank] == key(hit):
+            continue
+        yield {"stage": "refined", "rank": rank, "result": render(hit)}
+
+    yield {"stage": "done", "count": len(refined_hits)}
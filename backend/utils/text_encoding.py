@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import torch
+from transformers import PreTrainedTokenizerFast
+
+from backend.utils.singleflight import normalize_text
+
+# CLIP's text context length
+CLIP_MAX_TOKENS = 77
+
+
+class TextEncoder:
+    """
+    Tokenization front end for CLIP text models.
+
+    Texts are normalized the way CLIP's tokenizer would see them anyway, token ids
+    of recent strings are kept in an LRU cache, cache misses are tokenized in one
+    batch call to the fast (Rust) tokenizer, and each batch is padded only to its
+    longest item.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizerFast, max_length: int = CLIP_MAX_TOKENS, cache_size: int = 4096):
+        if not tokenizer.is_fast:
+            raise ValueError("TextEncoder needs a fast tokenizer")
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+        self._cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Fast tokenizers reject concurrent calls that change truncation settings
+        self._tokenizer_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def token_ids(self, texts: List[str]) -> List[List[int]]:
+        """Token ids of each text, truncated to max_length"""
+        normalized = [normalize_text(text) for text in texts]
+
+        with self._lock:
+            cached = {}
+            for text in normalized:
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    cached[text] = self._cache[text]
+            hits = sum(text in cached for text in normalized)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(normalized) - hits
+            missing = list(dict.fromkeys(text for text in normalized if text not in cached))
+
+        if missing:
+            with self._tokenizer_lock:
+                encoded = self.tokenizer(missing, truncation=True, max_length=self.max_length)["input_ids"]
+            with self._lock:
+                for text, ids in zip(missing, encoded):
+                    cached[text] = self._cache[text] = ids
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [cached[text] for text in normalized]
+
+    def encode(self, texts: List[str]) -> Dict[str, torch.Tensor]:
+        """Model inputs for a batch of texts, padded to the longest one"""
+        ids = self.token_ids(texts)
+        longest = max((len(item) for item in ids), default=0)
+
+        input_ids = torch.full((len(ids), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(ids), longest), dtype=torch.long)
+        for row, item in enumerate(ids):
+            input_ids[row, : len(item)] = torch.tensor(item, dtype=torch.long)
+            attention_mask[row, : len(item)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cached": len(self._cache), **self.stats}
@@ -0,0 +1,63 @@
+import hashlib
+import os
+from typing import Any, List, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+# Backend base URL, shared by all frontends
+API_URL = os.getenv("FOROFUSE_API_URL", "http://localhost:8000/api")
+
+# How long identical searches are answered from the frontend cache
+SEARCH_CACHE_TTL_SECONDS = 300
+SEARCH_CACHE_MAX_ENTRIES = 512
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive connection pool to the backend, shared across reruns and browser sessions"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a text query"""
+    return " ".join(text.lower().split())
+
+
+def content_digest(data: bytes) -> str:
+    """Cache key for uploaded file contents"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class _CacheMiss(Exception):
+    pass
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES, show_spinner=False)
+def _search_cache(kind: str, key: str, top_k: int, _results: Optional[List[Any]] = None) -> List[Any]:
+    # Exceptions are never cached, so a lookup without results leaves the entry empty
+    if _results is None:
+        raise _CacheMiss
+    return _results
+
+
+def cached_results(kind: str, key: str, top_k: int) -> Optional[List[Any]]:
+    """
+    Results of an identical earlier search, or None.
+
+    Lets pages stream results progressively on a miss and render instantly on a hit.
+    """
+    try:
+        return _search_cache(kind, key, top_k)
+    except _CacheMiss:
+        return None
+
+
+def store_results(kind: str, key: str, top_k: int, results: List[Any]):
+    """Remember the final results of a completed search"""
+    _search_cache(kind, key, top_k, _results=results)
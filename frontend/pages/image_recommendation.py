@@ -2,51 +2,93 @@ import streamlit as st
 import requests
 from PIL import Image
 import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+# Add frontend directory to Python path for the shared API client
+frontend_root = str(Path(__file__).parents[1])
+if frontend_root not in sys.path:
+    sys.path.append(frontend_root)
+
+from api_client import API_URL as BASE_API_URL, cached_results, content_digest, get_session, store_results
 
 # Configure page
 st.set_page_config(page_title="Image Similarity Search", page_icon="🔍", layout="wide")
 
 # Constants
-API_URL = "http://localhost:8000/api/images"
+API_URL = f"{BASE_API_URL}/images"
 THUMBNAIL_WIDTH = 300
+RESULT_LIMIT = 9
+
 
+# Shared pool for fetching thumbnails in parallel, kept across reruns
+@st.cache_resource
+def get_thumbnail_pool():
+    return get_session(), ThreadPoolExecutor(max_workers=RESULT_LIMIT)
 
-def search_similar_images(image_file):
-    """Search for similar images using the API"""
+
+def stream_similar_images(image_file, limit: int = RESULT_LIMIT):
+    """Stream similar-image events from the API as they are produced"""
     try:
         files = {"image": image_file}
-        response = requests.post(f"{API_URL}/search", files=files)
-        response.raise_for_status()
-        return response.json()
+        with get_session().post(
+            f"{API_URL}/search/stream", files=files, params={"limit": limit}, stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
     except requests.exceptions.RequestException as e:
         st.error(f"Error searching similar images: {str(e)}")
-        return None
 
 
-def display_image_grid(results):
-    """Display images in a 3x3 grid with metadata"""
-    if not results:
-        return
+def fetch_thumbnail(session, image_url):
+    """Fetch a cached thumbnail for a result image from the API"""
+    response = session.get(f"{API_URL}/thumb", params={"src": image_url, "size": THUMBNAIL_WIDTH})
+    response.raise_for_status()
+    return Image.open(io.BytesIO(response.content))
 
-    # Create rows with 3 columns each
-    for i in range(0, len(results), 3):
-        row = results[i : i + 3]
-        cols = st.columns(3)
 
-        for col, result in zip(cols, row):
-            with col:
-                try:
-                    # Load and display image
-                    response = requests.get(result["image_url"])
-                    img = Image.open(io.BytesIO(response.content))
-                    st.image(img, width=THUMBNAIL_WIDTH)
+def display_image_card(result):
+    """Display a result's metadata and start fetching its thumbnail in the background"""
+    # Reserve space for the image; it is filled in once the thumbnail arrives
+    image_slot = st.empty()
+
+    # Display metadata
+    st.markdown(f"**{result['name']}**")
+    st.markdown(f"Style: {result['style']}")
+    st.metric("Similarity", f"{result['similarity_score']}%", delta=None, delta_color="normal")
+
+    session, executor = get_thumbnail_pool()
+    return image_slot, executor.submit(fetch_thumbnail, session, result["image_url"])
+
 
-                    # Display metadata
-                    st.markdown(f"**{result['name']}**")
-                    st.markdown(f"Style: {result['style']}")
-                    st.metric("Similarity", f"{result['similarity_score']}%", delta=None, delta_color="normal")
-                except Exception as e:
-                    st.error(f"Error loading image: {str(e)}")
+def flush_thumbnails(pending, block=False):
+    """Render thumbnails that have finished downloading"""
+    if block:
+        wait([future for _, future in pending.values()])
+
+    for rank, (image_slot, future) in list(pending.items()):
+        if not future.done():
+            continue
+        try:
+            image_slot.image(future.result(), width=THUMBNAIL_WIDTH)
+        except Exception as e:
+            image_slot.error(f"Error loading image: {str(e)}")
+        del pending[rank]
+
+
+def create_image_grid(size):
+    """Create placeholders for a 3x3 grid, filled in as results stream in"""
+    slots = []
+    for _ in range(0, size, 3):
+        cols = st.columns(3)
+        for col in cols:
+            with col:
+                slots.append(st.empty())
+    return slots[:size]
 
 
 def main():
@@ -70,13 +112,34 @@ def main():
             st.subheader("Your Image")
             st.image(uploaded_file, width=THUMBNAIL_WIDTH)
 
-        # Search for similar images
-        with st.spinner("Searching for similar images..."):
-            results = search_similar_images(uploaded_file)
+        # Search for similar images, rendering hits as they arrive
+        st.subheader("Similar Images")
+        slots = create_image_grid(RESULT_LIMIT)
+        pending = {}
 
-            if results:
-                st.subheader("Similar Images")
-                display_image_grid(results)
+        # Identical uploads replay the final events of an earlier stream
+        cache_key = content_digest(uploaded_file.getvalue())
+        events = cached_results("images", cache_key, RESULT_LIMIT)
+        ranked = {}
+
+        with st.spinner("Searching for similar images..."):
+            for event in events if events is not None else stream_similar_images(uploaded_file):
+                if event["stage"] in ("fast", "refined"):
+                    with slots[event["rank"]].container():
+                        pending[event["rank"]] = display_image_card(event["result"])
+                    ranked[event["rank"]] = event
+                elif event["stage"] == "done":
+                    for rank, slot in enumerate(slots[event["count"] :], start=event["count"]):
+                        pending.pop(rank, None)
+                        slot.empty()
+                    if events is None:
+                        replay = [ranked[rank] for rank in range(event["count"]) if rank in ranked]
+                        store_results("images", cache_key, RESULT_LIMIT, [*replay, event])
+                elif event["stage"] == "error":
+                    st.error(f"Error searching similar images: {event['detail']}")
+                flush_thumbnails(pending)
+
+            flush_thumbnails(pending, block=True)
 
 
 if __name__ == "__main__":
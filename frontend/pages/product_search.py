@@ -6,20 +6,44 @@ import os
 import sys
 from pathlib import Path
 
-# Add project root to Python path
-project_root = str(Path(__file__).parents[2])
-if project_root not in sys.path:
-    sys.path.append(project_root)
+# Add frontend directory to Python path for the shared API client
+frontend_root = str(Path(__file__).parents[1])
+if frontend_root not in sys.path:
+    sys.path.append(frontend_root)
 
-from backend.services.unified_search import UnifiedSearcher
+from api_client import API_URL as BASE_API_URL, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS
+from api_client import content_digest, get_session, normalize_query
 
 st.set_page_config(page_title="Product Search", page_icon="🔍", layout="wide")
 
+API_URL = f"{BASE_API_URL}/products"
 
-# Initialize the searcher
-@st.cache_resource
-def get_searcher():
-    return UnifiedSearcher()
+
+def _post_search(data, files=None):
+    response = get_session().post(f"{API_URL}/search", data=data, files=files)
+    response.raise_for_status()
+    return response.json()
+
+
+# Failed requests raise, so only successful searches are cached
+@st.cache_data(ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES, show_spinner=False)
+def search_products_text(query, top_k):
+    """Search products by a normalized text query"""
+    return _post_search({"query": query, "top_k": top_k})
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES, show_spinner=False)
+def search_products_image(digest, top_k, _image_bytes):
+    """Search products by an uploaded image, cached by its content digest"""
+    return _post_search({"top_k": top_k}, files={"image": ("query", _image_bytes)})
+
+
+def run_search(search, *args):
+    """Run a cached search, turning backend errors into an error result"""
+    try:
+        return search(*args)
+    except requests.exceptions.RequestException as e:
+        return {"status": "error", "message": str(e), "results": []}
 
 
 def load_image(image_file):
@@ -60,8 +84,16 @@ def main():
     st.title("Product Search")
     st.write("Search products using text or image")
 
-    # Initialize searcher
-    searcher = get_searcher()
+    # Read the result count first so both search methods honour it
+    with st.sidebar:
+        st.header("Filters")
+        top_k = st.slider("Number of results", min_value=1, max_value=20, value=5)
+        st.info("""
+        Search Tips:
+        - For text search, try describing the product features
+        - For image search, upload a clear product image
+        - Adjust the number of results using the slider
+        """)
 
     # Create tabs for different search methods
     tab1, tab2 = st.tabs(["Text Search", "Image Search"])
@@ -72,7 +104,7 @@ def main():
         if st.button("Search", key="text_search"):
             if query_text:
                 with st.spinner("Searching..."):
-                    results = searcher.search(query_text)
+                    results = run_search(search_products_text, normalize_query(query_text), top_k)
                     display_results(results)
             else:
                 st.warning("Please enter a search query")
@@ -86,20 +118,10 @@ def main():
 
             if st.button("Search Similar Products", key="image_search"):
                 with st.spinner("Searching..."):
-                    results = searcher.search(image)
+                    image_bytes = uploaded_file.getvalue()
+                    results = run_search(search_products_image, content_digest(image_bytes), top_k, image_bytes)
                     display_results(results)
 
-    # Add filters
-    with st.sidebar:
-        st.header("Filters")
-        top_k = st.slider("Number of results", min_value=1, max_value=20, value=5)
-        st.info("""
-        Search Tips:
-        - For text search, try describing the product features
-        - For image search, upload a clear product image
-        - Adjust the number of results using the slider
-        """)
-
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,35 @@
 import streamlit as st
 import requests
 import json
-from typing import Dict, Any
+import sys
+from pathlib import Path
+from typing import Dict, Any, Iterator
+
+# Add frontend directory to Python path for the shared API client
+frontend_root = str(Path(__file__).parents[1])
+if frontend_root not in sys.path:
+    sys.path.append(frontend_root)
+
+from api_client import API_URL, cached_results, get_session, normalize_query, store_results
 
 # Configure page
 st.set_page_config(page_title="User Matching System", page_icon="👥", layout="wide")
 
-# Constants
-API_URL = "http://localhost:8000/api"
-
 
-def search_users(query: str, limit: int = 5) -> Dict[str, Any]:
+def stream_users(query: str, limit: int = 5) -> Iterator[Dict[str, Any]]:
     """
-    Send search query to backend API and return matches
+    Stream match events from the backend API as they are produced
     """
     try:
-        response = requests.post(f"{API_URL}/users/match", json={"query": query, "limit": limit})
-        response.raise_for_status()
-        return response.json()
+        with get_session().post(
+            f"{API_URL}/users/match/stream", json={"query": query, "limit": limit}, stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to API: {str(e)}")
-        return None
 
 
 def display_user_card(user: Dict[str, Any], compatibility: float, reasons: list):
@@ -83,19 +92,44 @@ def main():
 
     # Process search when form is submitted
     if submitted and query:
+        st.write("### 🎯 Matching Results")
+        header = st.empty()
+        slots = [st.empty() for _ in range(limit)]
+        count = 0
+
+        # Identical searches replay the final events of an earlier stream
+        cache_key = normalize_query(query)
+        events = cached_results("users", cache_key, limit)
+        replay = []
+        ranked = {}
+
         with st.spinner("Finding matches..."):
-            results = search_users(query, limit)
-
-            if results:
-                st.write("### 🎯 Matching Results")
-                st.write(f"*{results['query_understanding']}*")
-
-                for match in results["matches"]:
-                    display_user_card(
-                        user=match["user"], compatibility=match["compatibility_score"], reasons=match["match_reasons"]
-                    )
-            else:
-                st.warning("No matches found. Try adjusting your search criteria.")
+            for event in events if events is not None else stream_users(query, limit):
+                if event["stage"] == "query":
+                    header.write(f"*{event['query_understanding']}*")
+                    replay.append(event)
+                elif event["stage"] in ("fast", "refined"):
+                    match = event["result"]
+                    with slots[event["rank"]].container():
+                        display_user_card(
+                            user=match["user"],
+                            compatibility=match["compatibility_score"],
+                            reasons=match["match_reasons"],
+                        )
+                    ranked[event["rank"]] = event
+                elif event["stage"] == "done":
+                    count = event["count"]
+                    # Drop slots the refined pass no longer fills
+                    for slot in slots[count:]:
+                        slot.empty()
+                    if events is None:
+                        replay += [ranked[rank] for rank in range(count) if rank in ranked]
+                        store_results("users", cache_key, limit, [*replay, event])
+                elif event["stage"] == "error":
+                    st.error(f"Error finding matches: {event['detail']}")
+
+        if not count:
+            st.warning("No matches found. Try adjusting your search criteria.")
 
 
 if __name__ == "__main__":
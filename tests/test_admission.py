@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.utils.admission import LANE_BULK, LANE_INTERACTIVE, AdmissionQueue, DeadlineExceeded, Overloaded
+
+
+def _deadline(seconds=5.0):
+    return time.monotonic() + seconds
+
+
+def test_interactive_waiters_overtake_bulk_ones():
+    async def scenario():
+        queue = AdmissionQueue("test", max_concurrency=1, max_queue=4)
+        await queue.acquire(LANE_BULK, _deadline())
+        order = []
+
+        async def wait(name, lane):
+            await queue.acquire(lane, _deadline())
+            order.append(name)
+            queue.release()
+
+        tasks = [asyncio.create_task(wait("bulk", LANE_BULK)), asyncio.create_task(wait("text", LANE_INTERACTIVE))]
+        await asyncio.sleep(0)
+        queue.release()
+        await asyncio.gather(*tasks)
+        return order, queue.snapshot()
+
+    order, snapshot = asyncio.run(scenario())
+    assert order == ["text", "bulk"]
+    assert (snapshot["active"], snapshot["queued"]) == (0, 0)
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        queue = AdmissionQueue("test", max_concurrency=1, max_queue=0)
+        await queue.acquire(LANE_BULK, _deadline())
+        with pytest.raises(Overloaded):
+            await queue.acquire(LANE_BULK, _deadline())
+        return queue.snapshot()
+
+    assert asyncio.run(scenario())["rejected"] == 1
+
+
+def test_expired_waiter_leaves_the_queue():
+    async def scenario():
+        queue = AdmissionQueue("test", max_concurrency=1, max_queue=4)
+        await queue.acquire(LANE_BULK, _deadline())
+        with pytest.raises(DeadlineExceeded):
+            await queue.acquire(LANE_BULK, _deadline(0.01))
+        queue.release()
+        return queue.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert (snapshot["active"], snapshot["queued"], snapshot["expired"]) == (0, 0, 1)
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def scenario():
+        queue = AdmissionQueue("test", max_concurrency=1, max_queue=4)
+        await queue.acquire(LANE_BULK, _deadline())
+        gone = asyncio.create_task(queue.acquire(LANE_INTERACTIVE, _deadline()))
+        next_in_line = asyncio.create_task(queue.acquire(LANE_BULK, _deadline()))
+        await asyncio.sleep(0)
+
+        # Hand the slot over, then cancel the waiter before it resumes
+        queue.release()
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+
+        await asyncio.wait_for(next_in_line, timeout=1)
+        held = queue.snapshot()
+        queue.release()
+        return held, queue.snapshot()
+
+    held, released = asyncio.run(scenario())
+    assert (held["active"], held["queued"]) == (1, 0)
+    assert (released["active"], released["queued"]) == (0, 0)
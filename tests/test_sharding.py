@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.utils.sharding import ShardedQdrantClient, stable_point_id
+
+COLLECTION = "images"
+DIMENSION = 16
+POINTS = 300
+
+
+def _points():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(POINTS, DIMENSION)).astype(np.float32)
+    return [
+        models.PointStruct(id=stable_point_id(f"image-{i}"), vector=vector.tolist(), payload={"id": f"image-{i}"})
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def _load(client):
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=models.VectorParams(size=DIMENSION, distance=models.Distance.COSINE),
+    )
+    client.upsert(collection_name=COLLECTION, points=_points())
+    return client
+
+
+@pytest.fixture(scope="module")
+def single():
+    return _load(QdrantClient(":memory:"))
+
+
+@pytest.fixture(scope="module")
+def sharded():
+    return _load(ShardedQdrantClient([QdrantClient(":memory:") for _ in range(3)]))
+
+
+def _ids(points):
+    return [str(point.id) for point in points]
+
+
+def test_points_are_spread_over_every_shard(sharded):
+    counts = [shard.count(COLLECTION, exact=True).count for shard in sharded.shards]
+    assert sum(counts) == POINTS
+    assert all(counts)
+
+
+def test_search_matches_single_node(single, sharded):
+    query = _points()[0].vector
+    for offset in (0, 5, 40):
+        expected = single.query_points(COLLECTION, query=query, limit=10, offset=offset).points
+        merged = sharded.query_points(COLLECTION, query=query, limit=10, offset=offset).points
+        assert _ids(merged) == _ids(expected)
+        assert [point.score for point in merged] == pytest.approx([point.score for point in expected])
+
+
+def test_scroll_visits_every_point_once(sharded):
+    seen = []
+    offset = None
+    while True:
+        records, offset = sharded.scroll(COLLECTION, limit=64, offset=offset)
+        seen.extend(_ids(records))
+        if offset is None:
+            break
+    assert len(seen) == POINTS
+    assert set(seen) == {str(point.id) for point in _points()}
+
+
+def test_recommend_by_id_matches_single_node(single, sharded):
+    points = _points()
+    query = models.RecommendQuery(
+        recommend=models.RecommendInput(positive=[points[0].id, points[1].id], negative=[points[2].id])
+    )
+    expected = single.query_points(COLLECTION, query=query, limit=10).points
+    merged = sharded.query_points(COLLECTION, query=query, limit=10).points
+    assert _ids(merged) == _ids(expected)
+    assert not {str(points[i].id) for i in range(3)} & set(_ids(merged))
+
+
+def test_retrieve_keeps_the_order_of_ids(sharded):
+    ids = [point.id for point in _points()[:20]][::-1]
+    assert _ids(sharded.retrieve(COLLECTION, ids)) == [str(point_id) for point_id in ids]
+
+
+def test_search_skips_a_failing_shard(sharded):
+    # The third shard has no such collection, so every query to it fails
+    client = ShardedQdrantClient([*sharded.shards[:2], QdrantClient(":memory:")], max_failures=1)
+    query = _points()[0].vector
+    results = client.query_points(COLLECTION, query=query, limit=5).points
+    assert len(results) == 5
+    assert client.snapshot()["shard-2"]["healthy"] is False
@@ -0,0 +1,63 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.services.snapshots import export_snapshot, restore_snapshot
+from backend.utils.qdrant import QdrantSettings, create_qdrant_client, is_embedded
+from backend.utils.sharding import ShardedQdrantClient
+
+COLLECTION = "profiles"
+DIMENSION = 8
+POINTS = 1000
+
+
+def _embedded_client():
+    return create_qdrant_client(QdrantSettings(location=":memory:"))
+
+
+def _load(client):
+    vectors = np.random.default_rng(3).normal(size=(POINTS, DIMENSION)).astype(np.float32)
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=models.VectorParams(size=DIMENSION, distance=models.Distance.COSINE),
+    )
+    client.upsert(
+        collection_name=COLLECTION,
+        points=models.Batch(
+            ids=list(range(POINTS)), vectors=vectors.tolist(), payloads=[{"n": i} for i in range(POINTS)]
+        ),
+    )
+    return client
+
+
+def test_embedded_clients_are_detected():
+    assert is_embedded(_embedded_client())
+    assert is_embedded(ShardedQdrantClient([QdrantClient(":memory:"), _embedded_client()]))
+    assert not is_embedded(create_qdrant_client(QdrantSettings(host="qdrant.invalid")))
+
+
+def test_embedded_client_serializes_concurrent_calls():
+    client = _load(_embedded_client())
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        counts = list(executor.map(lambda _: client.count(COLLECTION, exact=True).count, range(64)))
+    assert counts == [POINTS] * 64
+
+
+def test_restore_into_embedded_client(tmp_path, caplog):
+    source = _load(_embedded_client())
+    export_snapshot(source, COLLECTION, tmp_path / "snapshot", page_size=128)
+
+    target = _embedded_client()
+    with caplog.at_level(logging.INFO):
+        restored = restore_snapshot(target, tmp_path / "snapshot", batch_size=64, workers=4)
+    assert "restoring with one worker" in caplog.text
+    assert restored == target.count(COLLECTION, exact=True).count == POINTS
+
+    ids = [0, 17, 999]
+    expected = source.retrieve(COLLECTION, ids, with_vectors=True)
+    actual = target.retrieve(COLLECTION, ids, with_vectors=True)
+    assert [record.payload for record in actual] == [record.payload for record in expected]
+    np.testing.assert_allclose([record.vector for record in actual], [record.vector for record in expected])